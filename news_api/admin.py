@@ -0,0 +1,43 @@
+from django.contrib import admin
+from django.utils.html import format_html
+
+from news_api.models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """
+    Read only: the rows are recorded by news_api.slow_queries.SlowQueryMiddleware.
+    """
+
+    list_display = ("created_at", "view", "method", "duration_ms", "analyzed", "short_sql")
+    list_filter = ("view", "analyzed", "database")
+    search_fields = ("sql", "path", "view")
+    date_hierarchy = "created_at"
+    fields = (
+        "created_at",
+        "view",
+        "method",
+        "path",
+        "database",
+        "duration_ms",
+        "analyzed",
+        "sql",
+        "params",
+        "formatted_plan",
+    )
+    readonly_fields = fields
+
+    @admin.display(description="SQL")
+    def short_sql(self, slow_query):
+        return slow_query.sql[:120]
+
+    @admin.display(description="Plan")
+    def formatted_plan(self, slow_query):
+        return format_html("<pre>{}</pre>", slow_query.plan)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, slow_query=None):
+        return False
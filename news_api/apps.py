@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class NewsApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "news_api"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from utils.metrics import install_query_recorder
+        from . import checks, signals  # noqa: F401
+
+        # Request metrics, profiling and slow query sampling measure the queries (see utils/metrics.py)
+        connection_created.connect(install_query_recorder)
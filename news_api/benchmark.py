@@ -0,0 +1,411 @@
+import asyncio
+import importlib
+import platform
+import re
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches, reverse
+
+from users_api.models import User
+from utils.global_values import ARTICLE_COLUMNS
+
+BENCHMARK_PASSWORD = "benchmark_password"
+# One user per role, clients with different column sets since their feed queries differ
+ROLES = {
+    "admin": {"user_profile": "EMP", "is_admin": True},
+    "employee": {"user_profile": "EMP"},
+    "client_info": {"user_profile": "CLI", "plan": "INFO"},
+    "client_pro_one": {"user_profile": "CLI", "plan": "PRO", "accessible_columns": [ARTICLE_COLUMNS[0][0]]},
+    "client_pro_all": {
+        "user_profile": "CLI",
+        "plan": "PRO",
+        "accessible_columns": [column for column, _ in ARTICLE_COLUMNS],
+    },
+}
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run (and their time) on a connection.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@contextmanager
+def async_news_reads():
+    """
+    Serve the news reads with their async views, as under ASGI (see settings.ASYNC_NEWS_READS).
+    """
+    with override_settings(ASYNC_NEWS_READS=True):
+        _reload_urls()
+        try:
+            yield
+        finally:
+            clear_url_caches()
+    _reload_urls()
+
+
+def _reload_urls():
+    # The URL patterns depend on ASYNC_NEWS_READS when they are imported
+    clear_url_caches()
+    for module in ("news_api.urls", settings.ROOT_URLCONF):
+        importlib.reload(importlib.import_module(module))
+
+
+@contextmanager
+def pooled_connections(max_size):
+    """
+    Take the connections to the default database from a pool of `max_size` (see utils/postgresql_pool).
+    """
+    from utils.postgresql_pool.base import close_pools
+
+    settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+    saved = {name: settings_dict[name] for name in ("ENGINE", "CONN_MAX_AGE", "OPTIONS")}
+    connection.close()
+    settings_dict.update(
+        ENGINE="utils.postgresql_pool",
+        CONN_MAX_AGE=0,
+        OPTIONS={**saved["OPTIONS"], "pool": {"min_size": 1, "max_size": max_size}},
+    )
+    del connections[DEFAULT_DB_ALIAS]  # Recreated with the pool backend
+    try:
+        yield
+    finally:
+        connection.close()
+        close_pools()
+        settings_dict.update(saved)
+        del connections[DEFAULT_DB_ALIAS]
+
+
+def get_pool(alias=DEFAULT_DB_ALIAS):
+    """
+    Return the connection pool of the database, None if it isn't pooled.
+    """
+    return getattr(connections[alias], "pool", None)
+
+
+SERVER_TIMING_DB = re.compile(r'db;dur=([0-9.]+);desc="(\d+) queries"')
+
+
+class ResourceMonitor(threading.Thread):
+    """
+    Sample the threads of the process and the connections to the database while a scenario runs,
+    and count the connections opened (the churn), by Django or by the connection pool.
+    """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_threads = threading.active_count()
+        self.peak_connections = 0
+        self.connects = 0
+        self.pool = get_pool()
+        self.pool_connects = self.pool.get_stats().get("connections_num", 0) if self.pool else 0
+
+    def count_connect(self, sender, connection, **kwargs):
+        # Pooled connections are counted by the pool, the monitor's own connection isn't counted
+        if getattr(connection, "pool", None) is None and threading.current_thread() is not self:
+            self.connects += 1
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while True:
+                    cursor.execute("SELECT count(*) - 1 FROM pg_stat_activity WHERE datname = current_database()")
+                    self.peak_connections = max(self.peak_connections, cursor.fetchone()[0])
+                    self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+                    if self.stopped.wait(self.interval):
+                        break
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        connection_created.connect(self.count_connect)
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.join()
+        connection_created.disconnect(self.count_connect)
+        if self.pool:
+            self.connects += self.pool.get_stats().get("connections_num", 0) - self.pool_connects
+
+    def summary(self):
+        return {
+            "peak_threads": self.peak_threads,
+            "peak_db_connections": self.peak_connections,
+            "db_connects": self.connects,
+        }
+
+
+def create_role_users():
+    """
+    Return {role: user} with a user (created if needed) for every role in ROLES.
+    """
+    users = {}
+    for role, extra_fields in ROLES.items():
+        email = f"benchmark.{role}@example.com"
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            user = User.objects.create_user(email, BENCHMARK_PASSWORD, name=f"Benchmark {role}", **extra_fields)
+        users[role] = user
+    return users
+
+
+def get_token(user):
+    response = Client().post(
+        reverse("token_obtain_pair"),
+        {"email": user.email, "password": BENCHMARK_PASSWORD},
+        content_type="application/json",
+    )
+    return response.json()["access"]
+
+
+def build_scenarios(users, detail_paths=100):
+    """
+    Return the scenarios to run: the feed and article detail for every role, the user listing for
+    the admin, and obtaining a token (which is mostly password hashing).
+
+    The articles requested in detail are taken from the role's own feed, so access control is
+    exercised the same way real traffic does.
+    """
+    scenarios = []
+    for role, user in users.items():
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {get_token(user)}"}
+        feed = Client(**headers).get(reverse("newsarticle-list"), {"page_size": detail_paths}).json()
+        scenarios.append({"name": f"{role}:news_list", "headers": headers, "paths": [reverse("newsarticle-list")]})
+        scenarios.append(
+            {
+                "name": f"{role}:news_detail",
+                "headers": headers,
+                "paths": [reverse("newsarticle-detail", args=[article["id"]]) for article in feed["results"]],
+            }
+        )
+        if role == "admin":
+            scenarios.append({"name": f"{role}:users_list", "headers": headers, "paths": [reverse("user_management")]})
+
+    user = users["client_pro_one"]
+    scenarios.append(
+        {
+            "name": "token",
+            "headers": {},
+            "method": "post",
+            "paths": [reverse("token_obtain_pair")],
+            "data": {"email": user.email, "password": BENCHMARK_PASSWORD},
+        }
+    )
+    return [scenario for scenario in scenarios if scenario["paths"]]
+
+
+def run_scenario(scenario, requests, concurrency, warmup=0):
+    """
+    Send `requests` requests of the scenario from `concurrency` threads (after `warmup` unrecorded ones).
+
+    Requests go through the whole Django stack (middleware, authentication, views) in this
+    process, without a server or the network, so the numbers only depend on the application
+    and the database. Every thread has its own database connection (or takes one from the pool),
+    like a threaded server.
+    """
+    method = scenario.get("method", "get")
+    paths = scenario["paths"]
+    results = []
+    lock = threading.Lock()
+    warmup_indexes, indexes = iter(range(warmup)), iter(range(requests))
+    clock = {}
+    # Every thread waits for the end of the warmup, then the clock starts
+    barrier = threading.Barrier(concurrency, action=lambda: clock.setdefault("started", time.perf_counter()))
+
+    def send(client, index):
+        counter = QueryCounter()
+        path = paths[index % len(paths)]
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            if method == "post":
+                response = client.post(path, scenario.get("data"), content_type="application/json")
+            else:
+                response = client.get(path)
+            elapsed = time.perf_counter() - started
+        # The test client leaves the connection open, a server closes it at the end of the request
+        # unless it is persistent (CONN_MAX_AGE), which returns pooled connections to their pool
+        close_old_connections()
+        return elapsed, counter.count, counter.duration, response.status_code
+
+    def take(iterator):
+        with lock:
+            return next(iterator, None)
+
+    def worker():
+        client = Client(raise_request_exception=False, **scenario["headers"])
+        try:
+            while (index := take(warmup_indexes)) is not None:
+                send(client, index)
+            barrier.wait()
+            while (index := take(indexes)) is not None:
+                result = send(client, index)
+                with lock:
+                    results.append(result)
+        finally:
+            connection.close()
+
+    with ResourceMonitor() as monitor:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    wall_time = time.perf_counter() - clock["started"]
+    return summarize(scenario["name"], results, wall_time, concurrency, monitor.summary())
+
+
+def run_async_scenario(scenario, requests, concurrency, warmup=0):
+    """
+    Like run_scenario, through Django's async request handling, as served by an ASGI server.
+
+    The `concurrency` requests in flight are coroutines of a single event loop. Like Django's
+    ASGIHandler, every request gets its own thread for its synchronous parts (database queries
+    included), whose connection is closed at the end of the request. The queries are counted
+    from the Server-Timing header (see utils/metrics.py).
+    """
+    return asyncio.run(_run_async_scenario(scenario, requests, concurrency, warmup))
+
+
+async def _run_async_scenario(scenario, requests, concurrency, warmup):
+    method = scenario.get("method", "get")
+    paths = scenario["paths"]
+    # "HTTP_AUTHORIZATION" -> "Authorization"
+    headers = {
+        name[5:].replace("_", "-").title(): value
+        for name, value in scenario["headers"].items()
+        if name.startswith("HTTP_")
+    }
+    client = AsyncClient(raise_request_exception=False)
+    results = []
+
+    async def send(index):
+        path = paths[index % len(paths)]
+        async with ThreadSensitiveContext():
+            started = time.perf_counter()
+            if method == "post":
+                response = await client.post(
+                    path, scenario.get("data"), content_type="application/json", headers=headers
+                )
+            else:
+                response = await client.get(path, headers=headers)
+            elapsed = time.perf_counter() - started
+            await sync_to_async(connections.close_all)()
+        db_timing = SERVER_TIMING_DB.search(response.headers.get("Server-Timing", ""))
+        queries, duration = (int(db_timing[2]), float(db_timing[1]) / 1000) if db_timing else (0, 0.0)
+        return elapsed, queries, duration, response.status_code
+
+    async def worker(indexes, record):
+        for index in indexes:
+            result = await send(index)
+            if record:
+                results.append(result)
+
+    # Every worker takes the next index from the same iterator
+    warmup_indexes = iter(range(warmup))
+    await asyncio.gather(*(worker(warmup_indexes, False) for _ in range(concurrency)))
+    indexes = iter(range(requests))
+    with ResourceMonitor() as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(indexes, True) for _ in range(concurrency)))
+        wall_time = time.perf_counter() - started
+    return summarize(scenario["name"], results, wall_time, concurrency, monitor.summary())
+
+
+def summarize(name, results, wall_time, concurrency, resources=None):
+    latencies = sorted(elapsed * 1000 for elapsed, _, _, _ in results)
+    queries = [count for _, count, _, _ in results]
+    query_times = [duration * 1000 for _, _, duration, _ in results]
+    status_codes = Counter(status_code for _, _, _, status_code in results)
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        percentiles = latencies * 99
+    return {
+        "name": name,
+        "requests": len(results),
+        "concurrency": concurrency,
+        "errors": sum(count for status_code, count in status_codes.items() if status_code >= 400),
+        "status_codes": {str(status_code): count for status_code, count in sorted(status_codes.items())},
+        "throughput_rps": round(len(results) / wall_time, 1) if wall_time else None,
+        "latency_ms": {
+            "p50": round(percentiles[49], 2),
+            "p95": round(percentiles[94], 2),
+            "p99": round(percentiles[98], 2),
+            "mean": round(statistics.fmean(latencies), 2),
+            "max": round(latencies[-1], 2),
+        },
+        "queries_per_request": {"mean": round(statistics.fmean(queries), 2), "max": max(queries)},
+        "query_time_ms": {"mean": round(statistics.fmean(query_times), 2)},
+        "resources": resources or {},
+    }
+
+
+def get_environment():
+    """
+    Describe what the report was measured on, so reports of different commits can be told apart.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "postgres": connection.pg_version,
+        "db_pool": get_pool() is not None,
+        "machine": platform.machine(),
+    }
+
+
+def compare_reports(baseline, report):
+    """
+    Return, for every scenario in both reports, how p95 latency (as a ratio) and queries per request changed.
+    """
+    baseline_scenarios = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    changes = []
+    for scenario in report["scenarios"]:
+        before = baseline_scenarios.get(scenario["name"])
+        if before is None:
+            continue
+        before_p95, after_p95 = before["latency_ms"]["p95"], scenario["latency_ms"]["p95"]
+        changes.append(
+            {
+                "name": scenario["name"],
+                "p95_ms": (before_p95, after_p95),
+                "p95_change": (after_p95 - before_p95) / before_p95 if before_p95 else 0.0,
+                "queries": (before["queries_per_request"]["mean"], scenario["queries_per_request"]["mean"]),
+            }
+        )
+    return changes
@@ -0,0 +1,169 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utils.metrics import registry
+
+
+def normalize_columns(columns):
+    """
+    Return the columns as a sorted tuple without duplicates, so equivalent entitlements share a key.
+    """
+    return tuple(sorted(set(columns or [])))
+
+
+class NewsFeedCache:
+    """
+    Cache for the published feed served to clients.
+
+    A client's feed only depends on its accessible columns (plus the open articles, which
+    have no column), so entries are keyed by the normalized column set and the request URL
+    (cursor, page size, fields...). Every column has a version number that is part of the
+    key: bumping it after an article of that column changes makes every entry that
+    includes the column unreachable, while feeds of other columns stay cached.
+    Unreachable entries are left to expire on their own.
+
+    The backend is the Django cache named by settings.NEWS_FEED_CACHE_ALIAS. Articles are
+    written by other processes than the one serving a feed (other workers, the publisher,
+    seed_news...), so it must be shared by all of them (see checks.py).
+    """
+
+    key_prefix = "news_feed"
+    # Version of every article, drafts included, bumped by every invalidation: the feeds of admins
+    # and employees are versioned by it
+    all_articles = "*"
+
+    def __init__(self, alias=None, timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def backend(self):
+        return caches[self.alias or settings.NEWS_FEED_CACHE_ALIAS]
+
+    def get_key(self, columns, url):
+        """
+        Return the key of the feed for `columns` at `url`, as of the current column versions.
+
+        Callers get the key once and use it for both `get` and `set`: a feed computed while
+        its columns are invalidated is then stored under a key that is already outdated.
+        """
+        # Open articles (empty column) are part of every client feed
+        columns = ("",) + normalize_columns(columns)
+        versions = self._versions(columns)
+        return self._build_key(columns, versions, url)
+
+    async def aget_key(self, columns, url):
+        """
+        Async version of get_key.
+        """
+        columns = ("",) + normalize_columns(columns)
+        versions = await self._aversions(columns)
+        return self._build_key(columns, versions, url)
+
+    def get_version(self):
+        """
+        Return the version of all the articles, which changes whenever any article is written.
+        """
+        return self._versions((self.all_articles,))[self.all_articles]
+
+    async def aget_version(self):
+        """
+        Async version of get_version.
+        """
+        return (await self._aversions((self.all_articles,)))[self.all_articles]
+
+    def get(self, key):
+        data = self.backend.get(key)
+        self._count("misses" if data is None else "hits")
+        return data
+
+    async def aget(self, key):
+        data = await self.backend.aget(key)
+        self._count("misses" if data is None else "hits")
+        return data
+
+    def set(self, key, data):
+        self.backend.set(key, data, self._get_timeout())
+
+    async def aset(self, key, data):
+        await self.backend.aset(key, data, self._get_timeout())
+
+    def invalidate(self, columns):
+        """
+        Drop every cached feed that includes any of the given columns ("" for open articles), and
+        change the version of all the articles.
+        """
+        for column in set(columns) | {self.all_articles}:
+            key = self._version_key(column)
+            try:
+                self.backend.incr(key)
+            except ValueError:
+                # Missing (e.g. evicted) version: restart from a fresh value no old entry uses
+                self.backend.set(key, time.time_ns(), None)
+            self._count("invalidations")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _versions(self, columns):
+        keys = {self._version_key(column): column for column in columns}
+        found = self.backend.get_many(keys)
+        versions = {keys[key]: value for key, value in found.items()}
+        for key, column in keys.items():
+            if column not in versions:
+                self.backend.add(key, time.time_ns(), None)
+                versions[column] = self.backend.get(key)
+        return versions
+
+    async def _aversions(self, columns):
+        keys = {self._version_key(column): column for column in columns}
+        found = await self.backend.aget_many(keys)
+        versions = {keys[key]: value for key, value in found.items()}
+        for key, column in keys.items():
+            if column not in versions:
+                await self.backend.aadd(key, time.time_ns(), None)
+                versions[column] = await self.backend.aget(key)
+        return versions
+
+    def _build_key(self, columns, versions, url):
+        digest = hashlib.sha1(url.encode()).hexdigest()
+        version_part = ",".join(f"{column}:{versions[column]}" for column in columns)
+        return f"{self.key_prefix}:{version_part}:{digest}"
+
+    def _get_timeout(self):
+        return self.timeout if self.timeout is not None else settings.NEWS_FEED_CACHE_TIMEOUT
+
+    def _version_key(self, column):
+        return f"{self.key_prefix}:version:{column}"
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+news_feed_cache = NewsFeedCache()
+
+
+def render_feed_cache_stats():
+    """
+    Render the hits, misses and invalidations of the feed cache in the Prometheus text format
+    (collected by utils.metrics.registry), counted since the worker started.
+    """
+    stats = news_feed_cache.stats()
+    yield "# HELP news_feed_cache_requests_total Client feed lookups in the cache."
+    yield "# TYPE news_feed_cache_requests_total counter"
+    yield f'news_feed_cache_requests_total{{result="hit"}} {stats["hits"]}'
+    yield f'news_feed_cache_requests_total{{result="miss"}} {stats["misses"]}'
+    yield "# HELP news_feed_cache_invalidations_total Column invalidations of the client feeds."
+    yield "# TYPE news_feed_cache_invalidations_total counter"
+    yield f"news_feed_cache_invalidations_total {stats['invalidations']}"
+
+
+registry.collectors.append(render_feed_cache_stats)
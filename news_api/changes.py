@@ -0,0 +1,185 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections, models, router
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from utils.global_values import ARTICLE_COLUMNS
+from .live import get_readable_columns
+from .models import ArticleEvent, NewsArticle
+
+TOKEN_SALT = "news_api.changes"
+# Open articles have an empty column
+ALL_COLUMNS = ["", *sorted(column for column, _ in ARTICLE_COLUMNS)]
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "The sync token is older than the change log, sync again without ?since="
+    default_code = "sync_token_expired"
+
+
+def get_sync_columns(user):
+    """
+    Return the sorted columns whose published articles are synced to the user.
+    """
+    columns = get_readable_columns(user)
+    return ALL_COLUMNS if columns is None else sorted(columns)
+
+
+def get_retention_cutoff(now=None):
+    """
+    Return the creation time before which events are expired (ARTICLE_EVENT_RETENTION_HOURS).
+    """
+    return (now or timezone.now()) - timedelta(hours=settings.ARTICLE_EVENT_RETENTION_HOURS)
+
+
+def load_sync_token(token):
+    """
+    Return the sync state of a token made by dump_sync_token. Tokens are only accepted as long as
+    the events they point to are kept (ARTICLE_EVENT_RETENTION_HOURS).
+    """
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=timedelta(hours=settings.ARTICLE_EVENT_RETENTION_HOURS))
+    except signing.SignatureExpired:
+        raise SyncTokenExpired()
+    except signing.BadSignature:
+        raise ValidationError({"since": "Invalid sync token."})
+
+
+def dump_sync_token(state):
+    return signing.dumps(state, salt=TOKEN_SALT, compress=True)
+
+
+def get_snapshot_xmin(using):
+    """
+    Return the oldest transaction still running: every event of an older transaction is committed
+    (or rolled back), while a running one may still commit events.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def get_changed_articles(columns, state, page_size):
+    """
+    Return the ids of the articles that changed since the sync `state`, at most `page_size` of
+    them, whether there are more, and the state to resume from. `columns` are the columns synced
+    to the user now (see get_sync_columns).
+
+    The state is a dict of:
+    - p, the position in the change log: the (transaction_id, id) of the last event read. Events
+      are read in that order, and only those of finished transactions, so an event committed late
+      (with a smaller id) is never skipped;
+    - c, the columns whose events are read, t, the columns the client is synced to;
+    - s, the columns whose published articles are scanned by id (from a, the last one sent) before
+      reading the log: every column on the first sync, those added or removed when the user's
+      entitlement changes. Until the log has been read to its end after such a scan, its events are
+      read for the previous columns too, so an article moved out of a removed column during the scan
+      gets its tombstone.
+
+    A None state starts a full sync. A state from before the start of a trimmed log (see
+    trim_article_events) may have missed deleted events, SyncTokenExpired is raised.
+    """
+    if state is not None:
+        start = (
+            ArticleEvent.objects.order_by("transaction_id", "id").values("transaction_id", "id", "created_at").first()
+        )
+        # The log only starts with an expired event once it was trimmed (or is about to be)
+        if start is not None and start["created_at"] < get_retention_cutoff():
+            if tuple(state["p"]) < (start["transaction_id"], start["id"]):
+                raise SyncTokenExpired()
+
+    if state is None:
+        using = ArticleEvent.objects.all().db
+        state = {"p": [get_snapshot_xmin(using), 0], "c": columns, "t": columns, "s": columns, "a": 0}
+    elif state["t"] != columns:
+        changed = set(state["t"]) ^ set(columns) | set(state["c"]) ^ set(columns)
+        state = {
+            **state,
+            "c": sorted(set(state["c"]) | set(columns)),
+            "t": columns,
+            "s": sorted(set(state["s"] or ()) | changed),
+            "a": 0,
+        }
+
+    if state["s"] is not None:
+        ids = list(
+            NewsArticle.objects.filter(status="PUBD", column__in=state["s"], id__gt=state["a"])
+            .order_by("id")
+            .values_list("id", flat=True)[: page_size + 1]
+        )
+        if len(ids) > page_size:
+            ids = ids[:page_size]
+            state = {**state, "a": ids[-1]}
+        else:
+            state = {**state, "s": None, "a": 0}
+        # The change log is read next
+        return ids, True, state
+
+    events = ArticleEvent.objects.all()
+    xmin = get_snapshot_xmin(events.db)
+    transaction_id, event_id = state["p"]
+    events = events.filter(
+        models.Q(transaction_id__gt=transaction_id) | models.Q(transaction_id=transaction_id, id__gt=event_id),
+        models.Q(column__in=state["c"]) | models.Q(previous_column__in=state["c"]),
+        transaction_id__lt=xmin,
+    )
+    # The latest event of every article, an article is only sent once however often it changed
+    latest = events.order_by("article_id", "-transaction_id", "-id").distinct("article_id").values("id")
+    page = list(
+        ArticleEvent.objects.filter(id__in=latest)
+        .order_by("transaction_id", "id")
+        .values_list("article_id", "transaction_id", "id")[: page_size + 1]
+    )
+    has_more = len(page) > page_size
+    page = page[:page_size]
+    if has_more:
+        state = {**state, "p": list(page[-1][1:])}
+    else:
+        # Up to date: every event of the transactions older than xmin has been read
+        state = {**state, "p": max(state["p"], [xmin, 0]), "c": state["t"]}
+    return [article_id for article_id, *_ in page], has_more, state
+
+
+def get_tombstone_reasons(article_ids):
+    """
+    Return {id: reason} for articles the user no longer sees: deleted, unpublished or not_entitled.
+    """
+    statuses = dict(NewsArticle.objects.filter(id__in=article_ids).values_list("id", "status"))
+    reasons = {}
+    for article_id in article_ids:
+        if article_id not in statuses:
+            reasons[article_id] = "deleted"
+        elif statuses[article_id] != "PUBD":
+            reasons[article_id] = "unpublished"
+        else:
+            reasons[article_id] = "not_entitled"
+    return reasons
+
+
+def trim_article_events(now=None):
+    """
+    Delete the events older than ARTICLE_EVENT_RETENTION_HOURS, return how many.
+
+    The log is trimmed from its start, in the order it is read, up to the newest expired event, which
+    is kept to mark where the log starts: a sync state from before it may have missed deleted events.
+    Events of transactions that may still be running are left for the next trim.
+    """
+    events = ArticleEvent.objects.using(router.db_for_write(ArticleEvent))
+    last = (
+        events.filter(created_at__lt=get_retention_cutoff(now), transaction_id__lt=get_snapshot_xmin(events.db))
+        .order_by("-transaction_id", "-id")
+        .values_list("transaction_id", "id")
+        .first()
+    )
+    if last is None:
+        return 0
+    transaction_id, event_id = last
+    deleted, _ = events.filter(
+        models.Q(transaction_id__lt=transaction_id) | models.Q(transaction_id=transaction_id, id__lt=event_id)
+    ).delete()
+    return deleted
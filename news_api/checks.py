@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core import checks
+
+# Backends whose entries are only seen by the process that wrote them
+PER_PROCESS_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_feed_cache(app_configs, **kwargs):
+    """
+    Warn when the news feeds are cached per process: invalidations made by the other processes
+    (the other workers, the publisher, seed_news, ingests...) would never reach it.
+    """
+    backend = settings.CACHES[settings.NEWS_FEED_CACHE_ALIAS]["BACKEND"]
+    if backend not in PER_PROCESS_CACHE_BACKENDS:
+        return []
+    return [
+        checks.Warning(
+            f"The news feed cache ({settings.NEWS_FEED_CACHE_ALIAS!r}) is local to each process.",
+            hint=(
+                "Feeds and feed ETags stay stale in every process but the one that wrote an article. Set "
+                "CACHE_BACKEND/CACHE_LOCATION to a shared cache, e.g. Redis, unless a single process serves "
+                "and writes everything."
+            ),
+            id="news_api.W001",
+        )
+    ]
@@ -0,0 +1,282 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from users_api.auth import StatelessJWTAuthentication, acheck_token_version
+from .models import ArticleEvent
+
+logger = logging.getLogger(__name__)
+
+# Channel the article events are sent on (see migration 0007)
+CHANNEL = "news_article_events"
+RECONNECT_DELAY = 1.0
+# ?access_token= for EventSource, which can't send an Authorization header
+TOKEN_PARAMETER = "access_token"
+
+
+class Subscription:
+    """
+    The events for one client of the live feed, filtered by the columns it can read (None for all).
+    """
+
+    def __init__(self, columns, max_size):
+        self.columns = columns
+        self.queue = asyncio.Queue(max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        kind = get_visible_kind(event, self.columns)
+        if kind is None:
+            return True
+        try:
+            self.queue.put_nowait({**event, "kind": kind})
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+        return True
+
+
+class ArticleEventListener:
+    """
+    LISTEN for the article events on a connection of its own, and send them to every subscription.
+
+    There's a single listener per process (per event loop, see get_listener), however many clients
+    are connected. After losing its connection it reconnects and sends the events committed in the
+    meantime from the ArticleEvent table, and the next subscription restarts it if it stopped on
+    an unexpected error. Subscriptions whose client doesn't keep up are dropped.
+    """
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.last_event_id = None
+        self.task = None
+        self.ready = asyncio.Event()
+
+    def subscribe(self, columns):
+        subscription = Subscription(columns, settings.LIVE_FEED_QUEUE_SIZE)
+        self.subscriptions.add(subscription)
+        if self.task is None:
+            # Not in the context of the subscribing request, whose thread for the ORM ends with it
+            self.task = asyncio.create_task(self.run(), context=contextvars.Context())
+            self.task.add_done_callback(self.on_task_done)
+        return subscription
+
+    def on_task_done(self, task):
+        # Stopped by an unexpected error (or cancelled): the next subscription starts it again
+        if task is self.task:
+            self.task = None
+            self.ready.clear()
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("The article event listener stopped", exc_info=task.exception())
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    def dispatch(self, event):
+        self.last_event_id = max(self.last_event_id or 0, event["id"])
+        for subscription in list(self.subscriptions):
+            if not subscription.put(event):
+                self.unsubscribe(subscription)
+
+    async def run(self):
+        while True:
+            try:
+                async with await connect() as connection:
+                    await connection.execute(f"LISTEN {CHANNEL}")
+                    self.ready.set()
+                    if self.last_event_id is not None:
+                        async for event in ArticleEvent.objects.filter(id__gt=self.last_event_id):
+                            self.dispatch(event.to_message())
+                    async for notify in connection.notifies():
+                        self.dispatch(json.loads(notify.payload))
+            except (psycopg.Error, DatabaseError):
+                logger.warning("Lost the connection listening for article events, reconnecting", exc_info=True)
+                self.ready.clear()
+                # The catch-up query uses the connection of the ORM's thread, which may be broken too
+                await close_connections()
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def stop(self):
+        if self.task is not None:
+            task, self.task = self.task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.ready.clear()
+
+
+_listeners = {}
+
+
+def get_listener():
+    """
+    Return the listener of the running event loop (there's one loop per ASGI worker process).
+    """
+    loop = asyncio.get_running_loop()
+    listener = _listeners.get(loop)
+    if listener is None:
+        for stale_loop in [stale_loop for stale_loop in _listeners if stale_loop.is_closed()]:
+            del _listeners[stale_loop]
+        listener = _listeners[loop] = ArticleEventListener()
+    return listener
+
+
+async def connect():
+    # The connection parameters of Django, for an async psycopg connection
+    params = connections[DEFAULT_DB_ALIAS].get_connection_params()
+    params.pop("cursor_factory", None)
+    return await psycopg.AsyncConnection.connect(**params, autocommit=True)
+
+
+def get_visible_kind(event, columns):
+    """
+    Return the kind of event a reader of `columns` (None for all) gets, None if it doesn't concern them.
+
+    An update that moves an article out of the reader's columns unpublishes it for them, one
+    that moves it in publishes it.
+    """
+    visible = columns is None or event["column"] in columns
+    was_visible = columns is None or event["previous_column"] in columns
+    kind = event["kind"]
+    if kind in ("unpublish", "delete"):
+        return kind if was_visible else None
+    if kind == "update" and visible != was_visible:
+        return "publish" if visible else "unpublish"
+    return kind if visible else None
+
+
+def get_readable_columns(user):
+    """
+    Return the columns whose published articles the user reads, None for all of them.
+    """
+    if user.is_admin or user.is_employee:
+        return None
+    # Open articles (empty column) are read by every client
+    return {""} | set(user.accessible_columns or [])
+
+
+async def close_connections():
+    """
+    Close the database connections of the ORM's thread (given back to the pool with DB_POOL), so they
+    aren't held until the end of a long running task or response.
+    """
+    await sync_to_async(connections.close_all)()
+
+
+async def is_token_valid(token):
+    """
+    Return whether the access token of a stream is neither expired nor revoked.
+    """
+    if time.time() >= token["exp"]:
+        return False
+    if "token_version" not in token:
+        return True
+    try:
+        await acheck_token_version(token)
+    except AuthenticationFailed:
+        return False
+    finally:
+        # The version may have been read from the database
+        await close_connections()
+    return True
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def stream_events(listener, columns, token, last_event_id=None):
+    """
+    Yield the server-sent events of the articles published or updated in `columns`.
+
+    With `last_event_id` the events since then are sent first, from the ArticleEvent table, or a
+    `reset` event if there are too many of them (the client should reload its feed instead). A
+    comment is sent after LIVE_FEED_HEARTBEAT_SECONDS without events. The token is checked again
+    as often, however many events are sent: the stream ends once it expires or is revoked, and
+    the client reconnects with a new one.
+
+    The stream holds no database connection between its lookups, however long it stays open.
+    """
+    subscription = listener.subscribe(columns)
+    try:
+        yield f"retry: {settings.LIVE_FEED_RETRY_MS}\n\n"
+        # Events sent before the listener is listening would be missed
+        await listener.ready.wait()
+        replayed = set()
+        if last_event_id is not None:
+            events = ArticleEvent.objects.filter(id__gt=last_event_id)
+            if columns is not None:
+                events = events.filter(column__in=columns) | events.filter(previous_column__in=columns)
+            events = [event async for event in events.order_by("id")[: settings.LIVE_FEED_MAX_RESUME_EVENTS + 1]]
+            if len(events) > settings.LIVE_FEED_MAX_RESUME_EVENTS:
+                yield format_event({"id": events[-1].id, "kind": "reset", "data": {}})
+                events = []
+            for event in events:
+                kind = get_visible_kind(event.to_message(), columns)
+                if kind is not None:
+                    yield format_event({**event.to_message(), "kind": kind})
+                replayed.add(event.id)
+        # Also used by the view to authenticate the user
+        await close_connections()
+
+        checked_at = time.monotonic()
+        while not subscription.overflowed or not subscription.queue.empty():
+            timeout = checked_at + settings.LIVE_FEED_HEARTBEAT_SECONDS - time.monotonic()
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                event = None
+            if time.monotonic() - checked_at >= settings.LIVE_FEED_HEARTBEAT_SECONDS:
+                if not await is_token_valid(token):
+                    return
+                checked_at = time.monotonic()
+            if event is None:
+                yield ": heartbeat\n\n"
+            elif event["id"] not in replayed:
+                yield format_event(event)
+    finally:
+        listener.unsubscribe(subscription)
+
+
+async def live_feed_view(request):
+    """
+    Stream the articles published or updated in the columns the user reads, as server-sent events
+    (publish, update, unpublish and delete, with the article summary as data). Needs the ASGI server.
+
+    Authenticated with the access token, in the Authorization header or ?access_token=. Clients
+    resume with the Last-Event-ID header, which EventSource sends when it reconnects.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("The live feed is only served by the ASGI server", status=501, content_type="text/plain")
+
+    authentication = StatelessJWTAuthentication()
+    try:
+        if TOKEN_PARAMETER in request.GET:
+            token = authentication.get_validated_token(request.GET[TOKEN_PARAMETER].encode())
+            user = await authentication.aget_user(token)
+        else:
+            user, token = await authentication.aauthenticate(request) or (None, None)
+    except (AuthenticationFailed, InvalidToken) as error:
+        return JsonResponse({"detail": str(error.detail)}, status=401)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    last_event_id = request.headers.get("Last-Event-ID")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    response = StreamingHttpResponse(
+        stream_events(get_listener(), get_readable_columns(user), token, last_event_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Not buffered by nginx
+    return response
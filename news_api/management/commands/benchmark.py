@@ -0,0 +1,151 @@
+import json
+from contextlib import nullcontext
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from news_api.benchmark import (
+    async_news_reads,
+    build_scenarios,
+    compare_reports,
+    create_role_users,
+    get_environment,
+    pooled_connections,
+    run_async_scenario,
+    run_scenario,
+)
+from news_api.cache import news_feed_cache
+from news_api.models import NewsArticle
+from users_api.models import User
+from utils.global_values import ARTICLE_COLUMNS
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency (p50/p95/p99), throughput and SQL queries per request of the news and user endpoints "
+        "for every role, on a dedicated database seeded with seed_news, and write a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--articles", type=int, default=10000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--requests", type=int, default=200, help="Recorded requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=4, help="Threads sending requests")
+        parser.add_argument("--warmup", type=int, default=10, help="Unrecorded requests per scenario")
+        parser.add_argument("--scenario", action="append", help="Only run scenarios whose name contains this")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", default="benchmark.json", help='Report file, "-" for stdout')
+        parser.add_argument("--baseline", help="Report of a previous run to compare with")
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            help="Fail if a scenario's p95 latency grew by more than this fraction (e.g. 0.2) over the baseline",
+        )
+        parser.add_argument(
+            "--keepdb", action="store_true", help="Keep the benchmark database (and its data) for the next run"
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Serve the requests like an ASGI server, with the async news views, instead of a threaded WSGI one",
+        )
+        parser.add_argument(
+            "--pool",
+            type=int,
+            metavar="SIZE",
+            help="Take the database connections from a pool of this size (see utils/postgresql_pool)",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        # Never touch the development data: the benchmark gets its own database, like the tests
+        database_name = connection.settings_dict["NAME"]
+        connection.settings_dict["TEST"]["NAME"] = f"benchmark_{database_name}"
+        verbosity = max(options["verbosity"] - 1, 0)
+        setup_test_environment(debug=False)  # Lets the test client in, and DEBUG would record every query
+        with pooled_connections(options["pool"]) if options["pool"] else nullcontext():
+            connection.creation.create_test_db(verbosity, autoclobber=True, serialize=False, keepdb=options["keepdb"])
+            try:
+                report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(database_name, verbosity, keepdb=options["keepdb"])
+                teardown_test_environment()
+
+        content = json.dumps(report, indent=2)
+        if options["output"] == "-":
+            self.stdout.write(content)
+        else:
+            with open(options["output"], "w") as output:
+                output.write(content)
+            self.stdout.write(f"Report written to {options['output']}")
+
+        if baseline is not None:
+            self.compare(baseline, report, options["max_regression"])
+
+    def run(self, options):
+        # With --keepdb only the missing rows are seeded
+        missing_articles = options["articles"] - NewsArticle.objects.count()
+        if missing_articles > 0:
+            call_command(
+                "seed_news",
+                users=max(options["users"] - User.objects.count(), 0),
+                articles=missing_articles,
+                seed=options["seed"],
+                verbosity=options["verbosity"],
+                stdout=self.stdout,
+            )
+        news_feed_cache.invalidate([""] + [column for column, _ in ARTICLE_COLUMNS])
+
+        scenarios = build_scenarios(create_role_users())
+        if options["scenario"]:
+            scenarios = [
+                scenario for scenario in scenarios if any(name in scenario["name"] for name in options["scenario"])
+            ]
+        if not scenarios:
+            raise CommandError("No scenario to run")
+
+        report = {
+            "environment": {**get_environment(), "server": "asgi" if options["asgi"] else "wsgi"},
+            "dataset": {"articles": NewsArticle.objects.count(), "users": User.objects.count()},
+            "scenarios": [],
+        }
+        run = run_async_scenario if options["asgi"] else run_scenario
+        self.stdout.write(
+            f"{'scenario':<30} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'queries':>8} "
+            f"{'threads':>8} {'conns':>8} {'connects':>8} errors"
+        )
+        with async_news_reads() if options["asgi"] else nullcontext():
+            for scenario in scenarios:
+                result = run(scenario, options["requests"], options["concurrency"], options["warmup"])
+                report["scenarios"].append(result)
+                latency, resources = result["latency_ms"], result["resources"]
+                self.stdout.write(
+                    f"{result['name']:<30} {latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} "
+                    f"{result['throughput_rps']:>8} {result['queries_per_request']['mean']:>8} "
+                    f"{resources['peak_threads']:>8} {resources['peak_db_connections']:>8} "
+                    f"{resources['db_connects']:>8} {result['errors']}"
+                )
+        return report
+
+    def compare(self, baseline, report, max_regression):
+        self.stdout.write(f"Compared with {baseline['environment'].get('commit')}:")
+        regressions = []
+        for change in compare_reports(baseline, report):
+            (before_p95, after_p95), (before_queries, after_queries) = change["p95_ms"], change["queries"]
+            line = (
+                f"{change['name']:<30} p95 {before_p95} -> {after_p95} ms ({change['p95_change']:+.0%}), "
+                f"queries {before_queries} -> {after_queries}"
+            )
+            regressed = max_regression is not None and change["p95_change"] > max_regression
+            if regressed or after_queries > before_queries:
+                regressions.append(change["name"])
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if max_regression is not None and regressions:
+            raise CommandError(f"Regressions in: {', '.join(regressions)}")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from news_api.changes import trim_article_events
+from news_api.publishing import publish_due_articles, run_publisher
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish the articles whose publish_at has passed, in batches, and delete the expired article events. "
+        "Runs until interrupted unless --once is given. Several workers can run at the same time, each claims "
+        "different articles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Articles published per transaction")
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="Seconds between checks for due articles, when idle"
+        )
+        parser.add_argument("--once", action="store_true", help="Publish what is due now, then exit")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            total = 0
+            while published := publish_due_articles(options["batch_size"]):
+                total += published
+            self.stdout.write(f"Published {total} articles, deleted {trim_article_events()} expired events")
+            return
+
+        def report(published, elapsed):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Published {published} articles in {elapsed * 1000:.0f} ms")
+
+        try:
+            run_publisher(options["batch_size"], options["interval"], on_batch=report)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,218 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from news_api.cache import news_feed_cache
+from news_api.models import NewsArticle
+from users_api.models import User
+from utils.global_values import ARTICLE_COLUMNS, PLANS, USER_PROFILES
+
+# Skewed like production: mostly clients, a few busy columns, mostly published articles
+# Every profile of USER_PROFILES: a few employees, the other profiles share the rest
+USER_PROFILE_WEIGHTS = {
+    profile: 3 if profile == "EMP" else 97 / (len(USER_PROFILES) - 1) for profile, _ in USER_PROFILES
+}
+ADMIN_SHARE = 0.05  # of the employees
+# Every plan of PLANS: mostly the first (the default, also given to employees), the others share the rest
+PLAN_WEIGHTS = {plan: 70 if rank == 0 else 30 / (len(PLANS) - 1) for rank, (plan, _) in enumerate(PLANS)}
+PRO_COLUMN_COUNT_WEIGHTS = {1: 50, 2: 30, 3: 15, len(ARTICLE_COLUMNS): 5}
+# Open articles (empty column), then the columns in the order of ARTICLE_COLUMNS, each less busy than the previous
+COLUMN_WEIGHTS = {"": 35, **{column: 25 * 0.7**rank for rank, (column, _) in enumerate(ARTICLE_COLUMNS)}}
+STATUS_WEIGHTS = {"PUBD": 85, "DRAF": 15}
+UPDATED_SHARE = 0.2  # of the articles, updated after their first publication
+
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "João"]
+LAST_NAMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Costa", "Rodrigues", "Almeida", "Nunes"]
+# Every column of COLUMN_WEIGHTS needs its words (see get_column_words)
+COLUMN_WORDS = {
+    "": ["governo", "congresso", "eleições", "economia", "política", "tribunal", "ministro", "reforma"],
+    "POW": ["poder", "presidente", "senado", "câmara", "votação", "partido", "coalizão", "planalto"],
+    "TAX": ["imposto", "tributação", "receita", "alíquota", "arrecadação", "contribuinte", "fisco", "isenção"],
+    "HLTH": ["saúde", "hospital", "vacina", "anvisa", "medicamento", "sus", "epidemia", "tratamento"],
+    "EN": ["energia", "petróleo", "eletricidade", "tarifa", "renovável", "aneel", "combustível", "usina"],
+    "LAB": ["trabalho", "emprego", "salário", "sindicato", "greve", "previdência", "trabalhador", "contrato"],
+}
+COMMON_WORDS = (
+    "o a de que e do da em um para com não uma os no se na por mais as dos como mas foi ao ele das tem à seu sua "
+    "ou ser quando muito há nos já está também só pelo pela até isso entre era depois sem mesmo aos ter seus quem "
+    "nas me esse eles estão você tinha foram essa num nem suas meu às minha têm numa pelos elas havia seja qual "
+    "será nós tenho lhe deles essas esses pelas este fosse dele projeto proposta decisão mercado setor país anos "
+    "estado federal nacional medida prazo votação segundo relatório dados bilhões milhões análise regra lei"
+).split()
+
+
+def get_column_words():
+    """
+    Return the words of every seeded column, refusing to seed a column (added to ARTICLE_COLUMNS) without them.
+    """
+    missing = [column for column in COLUMN_WEIGHTS if column not in COLUMN_WORDS]
+    if missing:
+        raise CommandError(f"No words to write articles of the columns {missing}, add them to COLUMN_WORDS")
+    return {column: COLUMN_WORDS[column] for column in COLUMN_WEIGHTS}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with realistic random users and news articles, loaded with COPY in chunks. "
+        "Every seeded user shares the same password, so they can log in for load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--articles", type=int, default=10000)
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per COPY (and per transaction)")
+        parser.add_argument("--days", type=int, default=730, help="How far back the articles go")
+        parser.add_argument("--seed", type=int, help="Random seed, for a reproducible dataset")
+        parser.add_argument("--password", default="seed_password")
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if not hasattr(cursor.cursor, "copy"):
+                raise CommandError("seed_news loads the data with COPY, which needs the psycopg (3) driver")
+
+        self.rng = random.Random(options["seed"])
+        self.chunk_size = options["chunk_size"]
+        self.verbosity = options["verbosity"]
+        self.now = timezone.now()
+        # A few thousand sentences are enough variety and much cheaper than drawing every word
+        self.sentences = {column: self.make_sentences(words) for column, words in get_column_words().items()}
+
+        started = time.perf_counter()
+        self.copy(User, self.user_rows(options["users"], options["password"]), options["users"])
+        employee_ids = list(User.objects.filter(user_profile="EMP").order_by("id").values_list("id", flat=True))
+        self.rng.shuffle(employee_ids)
+        if options["articles"] and not employee_ids:
+            raise CommandError("Articles need authors, seed some users (or create an employee) first")
+        self.copy(
+            NewsArticle, self.article_rows(options["articles"], employee_ids, options["days"]), options["articles"]
+        )
+
+        with connection.cursor() as cursor:
+            for model in (User, NewsArticle):
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        news_feed_cache.invalidate(COLUMN_WEIGHTS)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {options['users']} users and {options['articles']} articles in {elapsed:.1f}s "
+                f"({(options['users'] + options['articles']) / elapsed:.0f} rows/s)"
+            )
+        )
+
+    def copy(self, model, rows, total):
+        """
+        Load the (field name -> value) rows into the model's table, one COPY and one transaction per chunk.
+        """
+        table = connection.ops.quote_name(model._meta.db_table)
+        done = 0
+        while done < total:
+            count = min(self.chunk_size, total - done)
+            first = next(rows)
+            columns = ", ".join(connection.ops.quote_name(model._meta.get_field(name).column) for name in first)
+            with transaction.atomic(), connection.cursor() as cursor:
+                with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                    copy.write_row(tuple(first.values()))
+                    for _ in range(count - 1):
+                        copy.write_row(tuple(next(rows).values()))
+            done += count
+            if self.verbosity > 1:
+                self.stdout.write(f"{model._meta.verbose_name_plural}: {done}/{total}")
+
+    def user_rows(self, count, password):
+        rng, now = self.rng, self.now
+        password = make_password(password)  # PBKDF2 once, not once per user
+        tag = uuid.uuid4().hex[:8]  # Keeps the emails of successive runs apart, even with the same --seed
+        profiles, profile_weights = self.cumulative(USER_PROFILE_WEIGHTS)
+        plans, plan_weights = self.cumulative(PLAN_WEIGHTS)
+        column_counts, column_count_weights = self.cumulative(PRO_COLUMN_COUNT_WEIGHTS)
+        for i in range(count):
+            profile = rng.choices(profiles, cum_weights=profile_weights)[0]
+            is_employee = profile == "EMP"
+            plan = plans[0] if is_employee else rng.choices(plans, cum_weights=plan_weights)[0]
+            columns = None
+            if plan == "PRO":
+                columns = self.sample_columns(rng.choices(column_counts, cum_weights=column_count_weights)[0])
+            is_admin = is_employee and rng.random() < ADMIN_SHARE
+            created_at = now - timedelta(days=rng.uniform(0, 1500))
+            yield {
+                "password": password,
+                "is_superuser": False,
+                "email": f"seed{tag}.{i}@example.com",
+                "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                "user_profile": profile,
+                "profile_picture": "",
+                "profile_picture_variants": "{}",
+                "is_active": rng.random() < 0.97,
+                "is_staff": is_admin,
+                "is_admin": is_admin,
+                "employee_id": f"SEED{tag}{i}" if is_employee else "",
+                "plan": plan,
+                "accessible_columns": columns,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "token_version": 0,
+            }
+
+    def article_rows(self, count, employee_ids, days):
+        rng, now = self.rng, self.now
+        # Zipf-like: a handful of authors write most of the articles
+        author_weights = list(accumulate(1 / rank for rank in range(1, len(employee_ids) + 1)))
+        columns, column_weights = self.cumulative(COLUMN_WEIGHTS)
+        statuses, status_weights = self.cumulative(STATUS_WEIGHTS)
+        for _ in range(count):
+            column = rng.choices(columns, cum_weights=column_weights)[0]
+            status = rng.choices(statuses, cum_weights=status_weights)[0]
+            sentences = self.sentences[column]
+            # Recent articles are much more common than old ones
+            published_at = now - timedelta(days=min(rng.expovariate(8 / days), days))
+            updated_at = published_at
+            if rng.random() < UPDATED_SHARE:
+                updated_at = min(published_at + timedelta(hours=rng.expovariate(1 / 12)), now)
+            content = " ".join(rng.choices(sentences, k=int(rng.lognormvariate(3, 0.6)) + 1))
+            yield {
+                "title": rng.choice(sentences)[:200].rstrip("."),
+                "subtitle": " ".join(rng.choices(sentences, k=2))[:500],
+                "image": "",
+                "image_variants": "{}",
+                "draft_content": content,
+                "published_content": content if status == "PUBD" else "",
+                "created_at": published_at - timedelta(hours=rng.uniform(0, 48)),
+                "updated_at": updated_at,
+                "original_publication_at": published_at,
+                "last_publication_update_at": updated_at,
+                "author": rng.choices(employee_ids, cum_weights=author_weights)[0],
+                "status": status,
+                "column": column,
+            }
+
+    def make_sentences(self, topic_words, count=2000):
+        rng = self.rng
+        sentences = []
+        for _ in range(count):
+            words = rng.choices(COMMON_WORDS, k=rng.randint(6, 18)) + rng.choices(topic_words, k=rng.randint(1, 3))
+            rng.shuffle(words)
+            sentences.append(" ".join(words).capitalize() + ".")
+        return sentences
+
+    def sample_columns(self, count):
+        # Weighted sampling without replacement, so popular columns are picked more often
+        available = dict(COLUMN_WEIGHTS)
+        del available[""]
+        columns = []
+        for _ in range(min(count, len(available))):
+            column = self.rng.choices(list(available), weights=list(available.values()))[0]
+            del available[column]
+            columns.append(column)
+        return sorted(columns)
+
+    @staticmethod
+    def cumulative(weights):
+        return list(weights), list(accumulate(weights.values()))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.19 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="newsarticle",
+            index=models.Index(fields=["-last_publication_update_at", "-id"], name="news_feed_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="newsarticle",
+            index=models.Index(
+                condition=models.Q(("status", "PUBD")),
+                fields=["-last_publication_update_at", "-id"],
+                name="news_published_feed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newsarticle",
+            index=models.Index(
+                condition=models.Q(("status", "PUBD")),
+                fields=["column", "-last_publication_update_at", "-id"],
+                name="news_published_column_feed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newsarticle",
+            index=models.Index(fields=["author", "status"], name="news_author_status_idx"),
+        ),
+    ]
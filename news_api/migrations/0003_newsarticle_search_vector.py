@@ -0,0 +1,51 @@
+# Generated by Django 4.2.19 on 2026-10-18 19:27
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('portuguese', coalesce({row}title, '')), 'A')
+    || setweight(to_tsvector('portuguese', coalesce({row}subtitle, '')), 'B')
+    || setweight(to_tsvector('portuguese', coalesce({row}published_content, '')), 'C')
+"""
+
+CREATE_TRIGGER_SQL = f"""
+CREATE FUNCTION news_api_newsarticle_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR_SQL.format(row="NEW.")};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER news_api_newsarticle_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, subtitle, published_content ON news_api_newsarticle
+FOR EACH ROW EXECUTE FUNCTION news_api_newsarticle_search_vector_update();
+
+UPDATE news_api_newsarticle SET search_vector = {SEARCH_VECTOR_SQL.format(row="")};
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS news_api_newsarticle_search_vector_trigger ON news_api_newsarticle;
+DROP FUNCTION IF EXISTS news_api_newsarticle_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0002_newsarticle_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newsarticle",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+        migrations.AddIndex(
+            model_name="newsarticle",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="news_search_vector_idx"),
+        ),
+    ]
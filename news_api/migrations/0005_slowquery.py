@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0004_newsarticle_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("view", models.CharField(blank=True, max_length=200)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.TextField()),
+                ("database", models.CharField(max_length=100)),
+                ("sql", models.TextField()),
+                ("params", models.TextField(blank=True)),
+                ("duration_ms", models.FloatField()),
+                ("plan", models.TextField()),
+                ("analyzed", models.BooleanField()),
+            ],
+            options={
+                "verbose_name_plural": "slow queries",
+                "ordering": ["-id"],
+            },
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 4.2.19 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+# Every change to what readers see of a published article is recorded as an event and sent to the
+# listeners of the live feed (see news_api/live.py), including bulk updates and COPY
+CREATE_TRIGGER_SQL = """
+CREATE FUNCTION news_api_article_event() RETURNS trigger AS $$
+DECLARE
+    kind text;
+    article news_api_newsarticle;
+    previous_column text;
+    event news_api_articleevent;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF OLD.status <> 'PUBD' THEN
+            RETURN NULL;
+        END IF;
+        kind := 'delete';
+        article := OLD;
+    ELSIF NEW.status = 'PUBD' AND (TG_OP = 'INSERT' OR OLD.status <> 'PUBD') THEN
+        kind := 'publish';
+        article := NEW;
+    ELSIF NEW.status = 'PUBD' THEN
+        IF (NEW.title, NEW.subtitle, NEW.published_content, NEW."column", NEW.image,
+            NEW.original_publication_at, NEW.last_publication_update_at)
+           IS NOT DISTINCT FROM
+           (OLD.title, OLD.subtitle, OLD.published_content, OLD."column", OLD.image,
+            OLD.original_publication_at, OLD.last_publication_update_at) THEN
+            RETURN NULL;
+        END IF;
+        kind := 'update';
+        article := NEW;
+    ELSIF TG_OP = 'UPDATE' AND OLD.status = 'PUBD' THEN
+        kind := 'unpublish';
+        article := NEW;
+    ELSE
+        RETURN NULL;
+    END IF;
+    previous_column := CASE WHEN TG_OP = 'INSERT' THEN article."column" ELSE OLD."column" END;
+
+    INSERT INTO news_api_articleevent (kind, article_id, "column", previous_column, data, created_at)
+    VALUES (
+        kind,
+        article.id,
+        article."column",
+        previous_column,
+        jsonb_build_object(
+            'id', article.id,
+            'title', article.title,
+            'subtitle', article.subtitle,
+            'column', article."column",
+            'original_publication_at', article.original_publication_at,
+            'last_publication_update_at', article.last_publication_update_at
+        ),
+        now()
+    )
+    RETURNING * INTO event;
+    PERFORM pg_notify('news_article_events', json_build_object(
+        'id', event.id,
+        'kind', event.kind,
+        'column', event."column",
+        'previous_column', event.previous_column,
+        'data', event.data
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER news_api_article_event_trigger
+AFTER INSERT OR UPDATE OR DELETE ON news_api_newsarticle
+FOR EACH ROW EXECUTE FUNCTION news_api_article_event();
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS news_api_article_event_trigger ON news_api_newsarticle;
+DROP FUNCTION IF EXISTS news_api_article_event();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0006_newsarticle_publish_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArticleEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("publish", "Published"),
+                            ("update", "Updated"),
+                            ("unpublish", "Unpublished"),
+                            ("delete", "Deleted"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("article_id", models.BigIntegerField()),
+                (
+                    "column",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("POW", "Power"),
+                            ("TAX", "Taxes"),
+                            ("HLTH", "Health"),
+                            ("EN", "Energy"),
+                            ("LAB", "Labor"),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                (
+                    "previous_column",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("POW", "Power"),
+                            ("TAX", "Taxes"),
+                            ("HLTH", "Health"),
+                            ("EN", "Energy"),
+                            ("LAB", "Labor"),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                ("data", models.JSONField()),
+                ("created_at", models.DateTimeField()),
+            ],
+            options={
+                "ordering": ["id"],
+                "indexes": [models.Index(fields=["created_at"], name="article_event_created_idx")],
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.19 on 2026-10-18 21:08
+
+from django.db import migrations, models
+
+# The id of the transaction writing the event, filled in by the database for the trigger of migration 0007
+SET_DEFAULT_SQL = """
+ALTER TABLE news_api_articleevent ALTER COLUMN transaction_id SET DEFAULT (pg_current_xact_id()::text::bigint);
+"""
+
+DROP_DEFAULT_SQL = """
+ALTER TABLE news_api_articleevent ALTER COLUMN transaction_id DROP DEFAULT;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0007_articleevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="articleevent",
+            name="transaction_id",
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(SET_DEFAULT_SQL, DROP_DEFAULT_SQL),
+        migrations.AddIndex(
+            model_name="articleevent",
+            index=models.Index(fields=["transaction_id", "id"], name="article_event_position_idx"),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.19 on 2026-10-18 21:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0008_articleevent_transaction_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArticleViewCount",
+            fields=[
+                (
+                    "article",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="view_count",
+                        serialize=False,
+                        to="news_api.newsarticle",
+                    ),
+                ),
+                (
+                    "column",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("POW", "Power"),
+                            ("TAX", "Taxes"),
+                            ("HLTH", "Health"),
+                            ("EN", "Energy"),
+                            ("LAB", "Labor"),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                ("views", models.BigIntegerField()),
+                ("score", models.FloatField()),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["column", "-score"], name="article_view_trending_idx")],
+            },
+        ),
+    ]
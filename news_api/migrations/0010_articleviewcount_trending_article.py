@@ -0,0 +1,21 @@
+# Generated by Django 4.2.19 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news_api", "0009_articleviewcount"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="articleviewcount",
+            name="article_view_trending_idx",
+        ),
+        migrations.AddIndex(
+            model_name="articleviewcount",
+            index=models.Index(fields=["column", "-score", "-article"], name="article_view_trending_idx"),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from utils.functions import validate_image_file
@@ -9,12 +11,138 @@ class NewsArticle(models.Model):
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=500)
     image = models.ImageField(upload_to="news_images/", validators=[validate_image_file], blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Resized/WebP copies of image
     draft_content = models.TextField()  # Content of the article in draft mode (not visible to the public)
     published_content = models.TextField()  # Content of the article in published mode (visible to the public)
     created_at = models.DateTimeField(auto_now_add=True)  # Automatically set when created
     updated_at = models.DateTimeField(auto_now=True)  # Automatically set when updated
     original_publication_at = models.DateTimeField()  # Will set the date of the first publication
     last_publication_update_at = models.DateTimeField()  # Will set the date of the last update
+    # When the draft content gets published by the publish_scheduled worker (see publishing.py), if scheduled
+    publish_at = models.DateTimeField(null=True, blank=True)
     author = models.ForeignKey(to="users_api.User", on_delete=models.SET_NULL, null=True)  # Try this format instead
     status = models.CharField(max_length=4, choices=ARTICLE_STATUS)
     column = models.CharField(max_length=4, choices=ARTICLE_COLUMNS, blank=True)
+    # Weighted title/subtitle/published_content, kept up to date by a database trigger (see migration 0003)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Admin feed: every article, in pagination order
+            models.Index(fields=["-last_publication_update_at", "-id"], name="news_feed_idx"),
+            # Client/employee feed: only published articles, in pagination order
+            models.Index(
+                fields=["-last_publication_update_at", "-id"],
+                name="news_published_feed_idx",
+                condition=models.Q(status="PUBD"),
+            ),
+            # Client feed restricted to a few columns
+            models.Index(
+                fields=["column", "-last_publication_update_at", "-id"],
+                name="news_published_column_feed_idx",
+                condition=models.Q(status="PUBD"),
+            ),
+            # Employee's own articles, whatever their status
+            models.Index(fields=["author", "status"], name="news_author_status_idx"),
+            # Full text search
+            GinIndex(fields=["search_vector"], name="news_search_vector_idx"),
+            # Scheduled publications, in the order they are due
+            models.Index(
+                fields=["publish_at", "id"],
+                name="news_publish_at_idx",
+                condition=models.Q(publish_at__isnull=False),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the values as loaded, so signal handlers can tell what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class ArticleEvent(models.Model):
+    """
+    A change to a published article, written by a database trigger (see migration 0007) and
+    streamed by the live feed (see live.py).
+    """
+
+    KINDS = [
+        ("publish", "Published"),
+        ("update", "Updated"),
+        ("unpublish", "Unpublished"),
+        ("delete", "Deleted"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KINDS)
+    article_id = models.BigIntegerField()  # Not a foreign key: the events of deleted articles are kept
+    column = models.CharField(max_length=4, choices=ARTICLE_COLUMNS, blank=True)
+    previous_column = models.CharField(max_length=4, choices=ARTICLE_COLUMNS, blank=True)  # Before the change
+    data = models.JSONField()  # Summary of the article: id, title, subtitle, column and publication dates
+    created_at = models.DateTimeField()
+    # Transaction that wrote the event, set by the database (see migration 0008). The changes of
+    # /news/changes/ are read in (transaction_id, id) order, see changes.py
+    transaction_id = models.BigIntegerField(editable=False)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["created_at"], name="article_event_created_idx"),
+            models.Index(fields=["transaction_id", "id"], name="article_event_position_idx"),
+        ]
+
+    def to_message(self):
+        """
+        Return the event as sent by the trigger's NOTIFY.
+        """
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "column": self.column,
+            "previous_column": self.previous_column,
+            "data": self.data,
+        }
+
+
+class ArticleViewCount(models.Model):
+    """
+    How often an article was read, written in batches by the view counters of the workers (see trending.py).
+    """
+
+    article = models.OneToOneField(NewsArticle, on_delete=models.CASCADE, primary_key=True, related_name="view_count")
+    column = models.CharField(max_length=4, choices=ARTICLE_COLUMNS, blank=True)  # The article's, as of the last flush
+    views = models.BigIntegerField()
+    # Log of the views weighted by their age, comparable between articles at any time (see trending.py)
+    score = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Trending articles of a column, ties broken by the newest article
+            models.Index(fields=["column", "-score", "-article"], name="article_view_trending_idx"),
+        ]
+
+
+class SlowQuery(models.Model):
+    """
+    A query slower than settings.SLOW_QUERY_THRESHOLD_MS, with its plan (see slow_queries.py).
+    """
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    view = models.CharField(max_length=200, blank=True)  # "NewsArticleViewSet.list", or the URL name
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    database = models.CharField(max_length=100)  # Alias of the connection that ran the query
+    sql = models.TextField()
+    params = models.TextField(blank=True)
+    duration_ms = models.FloatField()
+    plan = models.TextField()
+    analyzed = models.BooleanField()  # Whether the plan comes from EXPLAIN ANALYZE (only queries without writes)
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name_plural = "slow queries"
+
+    def __str__(self):
+        return f"{self.view or self.path} ({self.duration_ms:.0f} ms)"
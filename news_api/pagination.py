@@ -0,0 +1,154 @@
+from django.db import models
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class NewsArticleCursorPagination(CursorPagination):
+    """
+    Keyset pagination for news articles ordered by (last_publication_update_at, id).
+
+    DRF's CursorPagination only keys on the first ordering field and falls back to an
+    OFFSET for rows sharing the same timestamp. Here the cursor position carries both
+    the timestamp and the id, so every position is unique and every page is a plain
+    range scan, no matter how deep the client has paged.
+    """
+
+    ordering = ("-last_publication_update_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    position_separator = "|"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of paginate_queryset.
+        """
+        queryset = self.get_page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([instance async for instance in queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Return the queryset of the requested page, plus one row, or None if the request isn't paginated.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (reverse, current_position) = (False, None)
+        else:
+            (_, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*[self._flip(order) for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = self.filter_from_position(queryset, current_position, reverse)
+        self.reverse, self.current_position = reverse, current_position
+        # Fetch an extra item to find out if there is a page following this one.
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        """
+        Keep the page out of the results of get_page_queryset, and where the next/previous pages start.
+        """
+        reverse, current_position = self.reverse, self.current_position
+        self.page = list(results[: self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def filter_from_position(self, queryset, position, reverse):
+        """
+        Keep only the rows strictly after `position` in the current direction.
+        """
+        try:
+            raw_timestamp, raw_id = position.rsplit(self.position_separator, 1)
+            timestamp = parse_datetime(raw_timestamp)
+            pk = int(raw_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        timestamp_field = self.ordering[0].lstrip("-")
+        id_field = self.ordering[1].lstrip("-")
+
+        # (cursor reversed) XOR (ordering descending) means we walk towards smaller keys
+        lookup = "lt" if reverse != self.ordering[0].startswith("-") else "gt"
+        return queryset.filter(**{f"{timestamp_field}__{lookup}e": timestamp}).filter(
+            models.Q(**{f"{timestamp_field}__{lookup}": timestamp})
+            | models.Q(**{timestamp_field: timestamp, f"{id_field}__{lookup}": pk})
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.next_position
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.previous_position
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering[:2]:
+            field_name = order.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[field_name]
+            else:
+                value = getattr(instance, field_name)
+            values.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        return self.position_separator.join(values)
+
+    @staticmethod
+    def _flip(order):
+        return order[1:] if order.startswith("-") else f"-{order}"
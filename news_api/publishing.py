@@ -0,0 +1,83 @@
+import logging
+import time
+
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .cache import news_feed_cache
+from .changes import trim_article_events
+from .models import NewsArticle
+
+logger = logging.getLogger(__name__)
+
+TRIM_INTERVAL = 3600  # Seconds between deletions of the expired article events
+
+
+def publish_due_articles(batch_size=500, now=None):
+    """
+    Publish up to `batch_size` articles whose publish_at has passed, oldest first. Returns how many.
+
+    The draft content becomes the published content, and the scheduled time becomes the last
+    publication update (and the original publication, for drafts). The articles are claimed with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several workers publish different batches side by side,
+    and updated with a single UPDATE. Neither sends post_save, so the affected feeds are
+    invalidated once the batch is committed.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            NewsArticle.objects.filter(publish_at__lte=now)
+            .order_by("publish_at", "id")
+            .select_for_update(skip_locked=True)
+            .values_list("id", "column")[:batch_size]
+        )
+        if not due:
+            return 0
+        NewsArticle.objects.filter(id__in=[article_id for article_id, _ in due]).update(
+            published_content=F("draft_content"),
+            status="PUBD",
+            original_publication_at=Case(
+                When(status="DRAF", then=F("publish_at")), default=F("original_publication_at")
+            ),
+            last_publication_update_at=F("publish_at"),
+            publish_at=None,
+            updated_at=now,  # auto_now is only applied by save()
+        )
+        columns = {column for _, column in due}
+        transaction.on_commit(lambda: news_feed_cache.invalidate(columns))
+    return len(due)
+
+
+def run_publisher(batch_size=500, interval=1.0, stop=None, on_batch=None):
+    """
+    Publish the due articles in batches until `stop()` returns True (never by default).
+
+    A backlog (e.g. everything scheduled at the top of the hour) is published batch after batch
+    without waiting, then the worker checks for due articles every `interval` seconds, which
+    bounds how late an article gets published. `on_batch(published, elapsed)` is called after
+    every batch that published something. Database errors (e.g. a dropped connection) are
+    logged and the batch is tried again after `interval`, on a new connection.
+
+    The publisher also trims the article events every TRIM_INTERVAL seconds, which are written
+    whatever serves the API.
+    """
+    stop = stop or (lambda: False)
+    trimmed_at = None
+    while not stop():
+        started = time.perf_counter()
+        try:
+            if trimmed_at is None or time.monotonic() - trimmed_at >= TRIM_INTERVAL:
+                trim_article_events()
+                trimmed_at = time.monotonic()
+            published = publish_due_articles(batch_size)
+        except DatabaseError:
+            logger.exception("Could not publish the due articles, trying again")
+            # Drops the broken connection, the next batch opens a new one
+            close_old_connections()
+            time.sleep(interval)
+            continue
+        if published and on_batch is not None:
+            on_batch(published, time.perf_counter() - started)
+        if published < batch_size:
+            time.sleep(interval)
@@ -1,12 +1,30 @@
 from rest_framework import serializers
+from django.contrib.auth import get_user_model
 from .models import NewsArticle
+from utils.serializers import ImageVariantsField, SparseFieldsetMixin
 
+User = get_user_model()
 
-class NewsArticleSerializer(serializers.ModelSerializer):
+
+class NewsArticleAuthorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Public representation of an article author, used by ?expand=author.
+    """
+
+    profile_picture_variants = ImageVariantsField("profile_picture", "profile_picture_variants")
+
+    class Meta:
+        model = User
+        fields = ["id", "name", "profile_picture", "profile_picture_variants"]
+
+
+class NewsArticleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for NewsArticle model.
     """
 
+    image_variants = ImageVariantsField("image", "image_variants")
+
     class Meta:
         model = NewsArticle
         fields = [
@@ -14,14 +32,40 @@ class NewsArticleSerializer(serializers.ModelSerializer):
             "title",
             "subtitle",
             "image",
+            "image_variants",
             "draft_content",
             "published_content",
             "created_at",
             "updated_at",
             "original_publication_at",
             "last_publication_update_at",
+            "publish_at",
             "author",
             "status",
             "column",
         ]
         read_only_fields = ["created_at", "updated_at", "author"]
+        expandable_fields = {"author": NewsArticleAuthorSerializer}
+
+
+class NewsArticleSummarySerializer(NewsArticleSerializer):
+    """
+    Serializer for NewsArticle lists, without the article bodies.
+    """
+
+    class Meta(NewsArticleSerializer.Meta):
+        fields = [
+            "id",
+            "title",
+            "subtitle",
+            "image",
+            "image_variants",
+            "created_at",
+            "updated_at",
+            "original_publication_at",
+            "last_publication_update_at",
+            "publish_at",
+            "author",
+            "status",
+            "column",
+        ]
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from utils.images import schedule_image_variants
+from .cache import news_feed_cache
+from .changes import ALL_COLUMNS
+from .models import NewsArticle
+from .serializers import NewsArticleAuthorSerializer
+
+User = get_user_model()
+# Fields of the authors nested in the feeds by ?expand=author
+AUTHOR_FIELDS = set(NewsArticleAuthorSerializer.Meta.fields) - {"id"}
+
+
+def get_feed_columns(instance):
+    """
+    Return the columns whose published feed is affected by a write to `instance`.
+    """
+    loaded_values = getattr(instance, "_loaded_values", {})
+    states = [(instance.column, instance.status)]
+    if "status" in loaded_values and "column" in loaded_values:
+        states.append((loaded_values["column"], loaded_values["status"]))
+    # Drafts never show up in a client feed, neither before nor after the write
+    return {column for column, status in states if status == "PUBD"}
+
+
+def invalidate_feed_on_commit(columns, using):
+    """
+    Invalidate the feeds of `columns` (none for a draft, which still changes the version of all the
+    articles) once the write is committed: invalidated earlier, a feed read
+    before the commit could be cached again under the new versions, and served until it expires.
+    """
+    transaction.on_commit(lambda: news_feed_cache.invalidate(columns), using=using)
+
+
+@receiver(post_save, sender=NewsArticle)
+def invalidate_feed_on_save(sender, instance, using, **kwargs):
+    invalidate_feed_on_commit(get_feed_columns(instance), using)
+    # The saved state is what the next save of this instance has to be compared with
+    instance._loaded_values = {
+        **getattr(instance, "_loaded_values", {}),
+        "column": instance.column,
+        "status": instance.status,
+    }
+
+
+@receiver(post_save, sender=NewsArticle)
+def generate_image_variants_on_save(sender, instance, **kwargs):
+    schedule_image_variants(instance, "image", "image_variants")
+
+
+@receiver(post_delete, sender=NewsArticle)
+def invalidate_feed_on_delete(sender, instance, using, **kwargs):
+    invalidate_feed_on_commit(get_feed_columns(instance), using)
+
+
+@receiver(post_save, sender=User)
+def invalidate_feed_on_author_save(sender, instance, created, using, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not set(update_fields) & AUTHOR_FIELDS):
+        return
+    if NewsArticle.objects.using(using).filter(author_id=instance.pk).exists():
+        invalidate_feed_on_commit(ALL_COLUMNS, using)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_feed_on_author_delete(sender, instance, using, **kwargs):
+    # Their articles no longer have an author, set by an update that sends no signal
+    invalidate_feed_on_commit(ALL_COLUMNS, using)
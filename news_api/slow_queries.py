@@ -0,0 +1,165 @@
+import random
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Subquery
+
+from news_api.models import SlowQuery
+from utils.metrics import RequestMetricsMiddleware, get_request_metrics
+
+# EXPLAIN ANALYZE runs the query again, so only the slowest ones of a request are explained
+MAX_QUERIES_PER_REQUEST = 3
+MAX_PARAMS_LENGTH = 10000
+EXPLAINABLE_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+LOCKING_CLAUSE = re.compile(r"\bFOR (NO KEY |KEY )?(UPDATE|SHARE)\b")
+FUNCTION_CALL = re.compile(r"\b([a-z_][a-z0-9_]*)\s*\(", re.IGNORECASE)
+REDACTED_PARAMS = "<redacted>"
+
+
+class SlowQueryMiddleware:
+    """
+    Record the queries of a request slower than settings.SLOW_QUERY_THRESHOLD_MS, with their
+    SQL, parameters, view and plan, as SlowQuery rows browsable in the admin.
+
+    Only a sample of the requests (settings.SLOW_QUERY_SAMPLE_RATE) is watched, the others don't
+    pay anything. The plans are taken once the response has been sent, when it is closed, so the
+    client doesn't wait for them: with EXPLAIN (ANALYZE, BUFFERS) for plain reads, a plain EXPLAIN
+    for statements that could write or call volatile functions.
+    Only the latest settings.SLOW_QUERY_MAX_RECORDS rows are kept. The queries are timed by the
+    request metrics, so this goes after utils.metrics.RequestMetricsMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        slow_queries = self.watch_queries()
+        response = self.get_response(request)
+        self.save_when_sent(request, response, slow_queries)
+        return response
+
+    async def __acall__(self, request):
+        slow_queries = self.watch_queries()
+        response = await self.get_response(request)
+        self.save_when_sent(request, response, slow_queries)
+        return response
+
+    @staticmethod
+    def save_when_sent(request, response, slow_queries):
+        if slow_queries:
+            # Called by response.close(), once the server has sent the response (in a thread under ASGI)
+            response._resource_closers.append(lambda: save_slow_queries(request, list(slow_queries)))
+
+    @staticmethod
+    def watch_queries():
+        """
+        Return the list the (duration, database alias, sql, params) of the request's slow queries are
+        appended to, if the request is part of the sample.
+        """
+        slow_queries = []
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        metrics = get_request_metrics()
+        if metrics is None or threshold <= 0 or random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+            return slow_queries
+
+        def record_slow_query(sql, params, many, context, duration):
+            if duration >= threshold and not many:
+                slow_queries.append((duration, context["connection"].alias, sql, params))
+
+        metrics.query_observers.append(record_slow_query)
+        return slow_queries
+
+
+def save_slow_queries(request, slow_queries):
+    """
+    Explain and save the slowest of the (duration, database alias, sql, params) queries run by the request.
+    """
+    match = getattr(request, "resolver_match", None)
+    view = RequestMetricsMiddleware.get_view_name(request) or (match.view_name if match else "")
+    slowest = sorted(slow_queries, key=lambda query: query[0], reverse=True)[:MAX_QUERIES_PER_REQUEST]
+    records = []
+    for duration, alias, sql, params in slowest:
+        plan, analyzed = explain(alias, sql, params)
+        if plan is None:
+            continue
+        records.append(
+            SlowQuery(
+                view=view,
+                method=request.method,
+                path=request.get_full_path(),
+                database=alias,
+                sql=sql,
+                params=format_params(sql, params),
+                duration_ms=round(duration * 1000, 3),
+                plan=plan,
+                analyzed=analyzed,
+            )
+        )
+    if records:
+        SlowQuery.objects.bulk_create(records)
+        trim_slow_queries(settings.SLOW_QUERY_MAX_RECORDS)
+
+
+def format_params(sql, params):
+    """
+    Return the parameters as recorded, redacted for the queries of the users table (password hashes...).
+    """
+    if not params:
+        return ""
+    if f'"{get_user_model()._meta.db_table}"' in sql:
+        return REDACTED_PARAMS
+    return repr(params)[:MAX_PARAMS_LENGTH]
+
+
+def explain(alias, sql, params):
+    """
+    Return the plan of the query and whether it was analyzed, or (None, False) if it can't be explained.
+
+    EXPLAIN ANALYZE runs the query, so only plain reads are analyzed: SELECTs without locking
+    clauses or calls to volatile functions (nextval, random...). It runs in a savepoint, so a
+    failure can't break the transaction of the request.
+    """
+    statement = sql.lstrip()[:6].upper()
+    if not statement.startswith(EXPLAINABLE_STATEMENTS):
+        return None, False
+    try:
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            analyzed = (
+                statement == "SELECT" and not LOCKING_CLAUSE.search(sql) and not calls_volatile_functions(cursor, sql)
+            )
+            options = "ANALYZE, BUFFERS" if analyzed else "COSTS"
+            cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+            return "\n".join(row[0] for row in cursor.fetchall()), analyzed
+    except DatabaseError:
+        return None, False
+
+
+def calls_volatile_functions(cursor, sql):
+    """
+    Return whether the query calls a function named like a volatile one (any overload).
+    """
+    names = sorted({name.lower() for name in FUNCTION_CALL.findall(sql)})
+    if not names:
+        return False
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_proc WHERE proname = ANY(%s) AND provolatile = 'v')", [names])
+    return cursor.fetchone()[0]
+
+
+def trim_slow_queries(max_records):
+    """
+    Delete all but the latest `max_records` slow queries.
+    """
+    max_records = max(max_records, 1)
+    oldest_kept = SlowQuery.objects.order_by("-id").values_list("id", flat=True)[max_records - 1 : max_records]
+    SlowQuery.objects.filter(id__lt=Subquery(oldest_kept)).delete()
@@ -0,0 +1,140 @@
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from .models import ArticleViewCount
+
+logger = logging.getLogger(__name__)
+
+# Scores are relative to this date (see get_score_offset)
+SCORE_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+# Adds the pending views of every article in one statement. Scores are log-sums,
+# ln(e^score + e^new_score), computed without overflowing (or underflowing exp)
+UPSERT_SQL = """
+INSERT INTO news_api_articleviewcount (article_id, "column", views, score, updated_at)
+SELECT article.id, article."column", pending.views, ln(pending.views::float8) + %(offset)s, %(now)s
+FROM unnest(%(article_ids)s::bigint[], %(views)s::bigint[]) AS pending (article_id, views)
+JOIN news_api_newsarticle article ON article.id = pending.article_id
+ORDER BY article.id
+ON CONFLICT (article_id) DO UPDATE SET
+    "column" = EXCLUDED."column",
+    views = news_api_articleviewcount.views + EXCLUDED.views,
+    score = GREATEST(news_api_articleviewcount.score, EXCLUDED.score)
+        + ln(1 + exp(-LEAST(abs(news_api_articleviewcount.score - EXCLUDED.score), 700))),
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def get_score_offset(now):
+    """
+    Return the log of the weight of a view at `now`.
+
+    A view counts half as much as one TRENDING_HALF_LIFE_HOURS younger. Rather than decaying every
+    score on every flush, views are weighted by 2^(hours since SCORE_EPOCH / half-life): every score
+    is then the decayed score times the same factor, so they rank the same. Scores are kept as logs
+    so the weights never overflow.
+    """
+    hours = (now - SCORE_EPOCH).total_seconds() / 3600
+    return hours / settings.TRENDING_HALF_LIFE_HOURS * math.log(2)
+
+
+class ViewCounter:
+    """
+    Views of articles, counted in memory and written to ArticleViewCount in batches.
+
+    Every retrieve would otherwise update a row of the primary. The counts of a worker are flushed
+    with one upsert every VIEW_COUNTER_FLUSH_SECONDS by a background thread, started by the first
+    view, or as soon as VIEW_COUNTER_MAX_PENDING articles were viewed by the request that fills the
+    counter, and when the worker exits; flushes also update the trending scores. The views of the
+    last interval are lost if the worker is killed, and kept for the next flush if the database
+    can't be written.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+        self._flusher = None
+
+    def record(self, article_id):
+        if self._count(article_id):
+            self.flush()
+
+    async def arecord(self, article_id):
+        """
+        Async version of record, only leaves the event loop to flush.
+        """
+        if self._count(article_id):
+            await sync_to_async(self.flush)()
+
+    def flush(self, now=None):
+        """
+        Write the pending views, return how many articles were updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        now = now or timezone.now()
+        # Rows are locked in the same order by every worker
+        article_ids = sorted(pending)
+        params = {
+            "article_ids": article_ids,
+            "views": [pending[article_id] for article_id in article_ids],
+            "offset": get_score_offset(now),
+            "now": now,
+        }
+        using = router.db_for_write(ArticleViewCount)
+        try:
+            # A savepoint when flushed inside a transaction, which a failure must not break
+            with transaction.atomic(using=using), connections[using].cursor() as cursor:
+                cursor.execute(UPSERT_SQL, params)
+        except DatabaseError:
+            logger.warning("Could not write the view counts, keeping them for the next flush", exc_info=True)
+            with self._lock:
+                self._pending.update(pending)
+            return 0
+        return len(article_ids)
+
+    def _count(self, article_id):
+        """
+        Count a view, return whether the counter is full and must be flushed (by a single caller).
+        """
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, name="view-counter", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+            self._pending[article_id] += 1
+            return len(self._pending) >= settings.VIEW_COUNTER_MAX_PENDING
+
+    def _flush_periodically(self):
+        """
+        Flush the views every VIEW_COUNTER_FLUSH_SECONDS, so they're written even when no more come in.
+        """
+        while True:
+            time.sleep(max(self._flushed_at + settings.VIEW_COUNTER_FLUSH_SECONDS - time.monotonic(), 0.1))
+            if time.monotonic() - self._flushed_at < settings.VIEW_COUNTER_FLUSH_SECONDS:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not write the view counts")
+            finally:
+                # The connection of this thread would otherwise stay open between flushes
+                connections.close_all()
+
+
+view_counter = ViewCounter()
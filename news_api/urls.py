@@ -1,10 +1,16 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from utils.async_views import with_async_views
+from .live import live_feed_view
 from .views import NewsArticleViewSet
 
 router = DefaultRouter()
 router.register(r"", NewsArticleViewSet, basename="newsarticle")
 
 urlpatterns = [
-    path("", include(router.urls)),
+    # Before the router, whose detail route would take "live" for an id
+    path("live/", live_feed_view, name="news-live"),
+    # Under ASGI, list and retrieve run on the event loop (see utils/async_views.py)
+    path("", include(with_async_views(router.urls) if settings.ASYNC_NEWS_READS else router.urls)),
 ]
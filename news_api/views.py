@@ -1,13 +1,62 @@
-from rest_framework import viewsets, permissions
-from drf_yasg.utils import swagger_auto_schema
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from drf_yasg import openapi
+from drf_yasg.utils import no_body, swagger_auto_schema
 from .models import NewsArticle
-from .serializers import NewsArticleSerializer
+from .serializers import NewsArticleSerializer, NewsArticleSummarySerializer
+from .pagination import NewsArticleCursorPagination
+from .cache import news_feed_cache
+from .changes import (
+    ALL_COLUMNS,
+    dump_sync_token,
+    get_changed_articles,
+    get_sync_columns,
+    get_tombstone_reasons,
+    load_sync_token,
+)
+from .ingest import ingest_articles
+from .trending import view_counter
+import hashlib
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.db import models
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth import get_user_model
+from utils.async_views import aget_object_or_404
+from utils.db_routers import using_primary
+from utils.functions import get_query_param_list
+from utils.global_values import SEARCH_CONFIG
 
 User = get_user_model()
 
+FIELDS_PARAMETER = openapi.Parameter(
+    "fields", openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING
+)
+EXPAND_PARAMETER = openapi.Parameter(
+    "expand", openapi.IN_QUERY, description="Comma separated relations to expand (author)", type=openapi.TYPE_STRING
+)
+SINCE_PARAMETER = openapi.Parameter(
+    "since",
+    openapi.IN_QUERY,
+    description="Sync token of the previous sync, none for a full sync",
+    type=openapi.TYPE_STRING,
+)
+COLUMN_PARAMETER = openapi.Parameter(
+    "column",
+    openapi.IN_QUERY,
+    description="Column (empty for the open articles)",
+    type=openapi.TYPE_STRING,
+    required=True,
+)
+SEARCH_PARAMETER = openapi.Parameter(
+    "q", openapi.IN_QUERY, description="Search terms (web search syntax)", type=openapi.TYPE_STRING, required=True
+)
+
 
 class IsEmployeeOrReadOnly(permissions.BasePermission):
     """
@@ -35,7 +84,7 @@ class IsEmployeeOrReadOnly(permissions.BasePermission):
         if request.user.is_admin:
             return True
 
-        return obj.author == request.user
+        return obj.author_id == request.user.pk
 
 
 class NewsArticleViewSet(viewsets.ModelViewSet):
@@ -43,7 +92,9 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
     ViewSet for viewing and editing news articles.
 
     list:
-    Return a list of all news articles the user has access to.
+    Return a cursor-paginated list of the news articles the user has access to,
+    newest publication update first. Article bodies are only sent by retrieve.
+    Client feeds are cached by accessible columns.
 
     create:
     Create a new news article (employee only).
@@ -51,6 +102,10 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
     retrieve:
     Return the given news article if user has access.
 
+    list and retrieve accept ?fields=id,title,... to return only some fields and
+    ?expand=author to nest the author instead of its id. Both send an ETag (and
+    retrieve a Last-Modified header) and answer conditional requests with 304 Not Modified.
+
     update:
     Update the given news article (employee only, admin can update any).
 
@@ -59,17 +114,265 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
 
     destroy:
     Delete the given news article (employee only, admin can delete any).
+
+    search:
+    Return the articles the user has access to that match ?q=, best matches first.
+
+    bulk:
+    Create articles from an NDJSON body, one article per line (employee only).
+
+    trending:
+    Return the most read published articles of ?column= (required, empty for the open
+    articles) the user has access to.
+    Views are counted by retrieve, the more recent ones weigh more.
+
+    changes:
+    Return the published articles the user reads that changed since ?since=, for offline
+    clients, and tombstones for those they should drop.
     """
 
     serializer_class = NewsArticleSerializer
     permission_classes = [permissions.IsAuthenticated, IsEmployeeOrReadOnly]
+    pagination_class = NewsArticleCursorPagination
 
     @swagger_auto_schema(
-        operation_description="List news articles based on user's access level",
-        responses={200: NewsArticleSerializer(many=True)},
+        operation_description="List news articles based on user's access level, paginated by cursor",
+        manual_parameters=[FIELDS_PARAMETER, EXPAND_PARAMETER],
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        # Lists have no Last-Modified: removing an article other than the latest wouldn't change it
+        if not self.is_client_feed(request.user):
+            # The version is bumped once a write is committed on the primary, where a replica may not
+            # have it yet: a page read there would be sent (and kept by the client) under the new ETag
+            with using_primary():
+                etag = self.get_etag(request.user.pk, news_feed_cache.get_version())
+                return self.conditional_response(etag, None, lambda: super(NewsArticleViewSet, self).list(request))
+
+        # A client's feed only depends on its columns, so clients with the same columns share it
+        cache_key = news_feed_cache.get_key(request.user.accessible_columns, request.build_absolute_uri())
+        cached = news_feed_cache.get(cache_key)
+        if cached is not None:
+            return self.conditional_response(cached["etag"], None, lambda: Response(cached["data"]))
+
+        # The key holds the versions of the feed's columns, so it changes with the feed
+        etag = self.get_etag(cache_key)
+
+        # Cached feeds are served to other clients, so they are read from the primary: a lagging
+        # replica could otherwise cache the feed as it was before an invalidation
+        with using_primary():
+
+            def get_response():
+                response = super(NewsArticleViewSet, self).list(request)
+                news_feed_cache.set(cache_key, {"data": response.data, "etag": etag})
+                return response
+
+            return self.conditional_response(etag, None, get_response)
+
+    async def alist(self, request, *args, **kwargs):
+        """
+        Async version of list, served when ASYNC_NEWS_READS is enabled (see utils/async_views.py).
+        """
+        if not self.is_client_feed(request.user):
+            with using_primary():
+                etag = self.get_etag(request.user.pk, await news_feed_cache.aget_version())
+                return await self.aconditional_response(etag, None, lambda: self.alist_page(request))
+
+        cache_key = await news_feed_cache.aget_key(request.user.accessible_columns, request.build_absolute_uri())
+        cached = await news_feed_cache.aget(cache_key)
+        if cached is not None:
+
+            async def get_cached_response():
+                return Response(cached["data"])
+
+            return await self.aconditional_response(cached["etag"], None, get_cached_response)
+
+        etag = self.get_etag(cache_key)
+        with using_primary():
+
+            async def get_response():
+                response = await self.alist_page(request)
+                await news_feed_cache.aset(cache_key, {"data": response.data, "etag": etag})
+                return response
+
+            return await self.aconditional_response(etag, None, get_response)
+
+    async def alist_page(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @swagger_auto_schema(
+        operation_description="Return a news article the user has access to",
+        manual_parameters=[FIELDS_PARAMETER, EXPAND_PARAMETER],
+    )
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        view_counter.record(instance.pk)
+        etag = self.get_etag(instance.pk, instance.updated_at)
+        return self.conditional_response(
+            etag, instance.updated_at, lambda: Response(self.get_serializer(instance).data)
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """
+        Async version of retrieve.
+        """
+        instance = await self.aget_object()
+        await view_counter.arecord(instance.pk)
+        etag = self.get_etag(instance.pk, instance.updated_at)
+
+        async def get_response():
+            return Response(self.get_serializer(instance).data)
+
+        return await self.aconditional_response(etag, instance.updated_at, get_response)
+
+    async def aget_object(self):
+        """
+        Async version of get_object.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    @swagger_auto_schema(
+        operation_description="Full text search over the news articles the user has access to",
+        manual_parameters=[SEARCH_PARAMETER, FIELDS_PARAMETER, EXPAND_PARAMETER],
+    )
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        terms = request.query_params.get("q", "").strip()
+        if not terms:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        query = SearchQuery(terms, config=SEARCH_CONFIG, search_type="websearch")
+        queryset = (
+            self.get_queryset()
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(models.F("search_vector"), query))
+            .order_by("-rank", "-last_publication_update_at", "-id")
+        )
+        # Ranked results can't be keyset paginated, only the best page is returned
+        limit = self.paginator.get_page_size(request)
+        serializer = self.get_serializer(queryset[:limit], many=True)
+        return Response({"results": serializer.data})
+
+    @swagger_auto_schema(
+        operation_description="Most read published articles of a column the user reads, recent views weigh more",
+        manual_parameters=[COLUMN_PARAMETER, FIELDS_PARAMETER, EXPAND_PARAMETER],
+    )
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        column = request.query_params.get("column")
+        if column is None:
+            raise ValidationError({"column": "This parameter is required."})
+        if column not in ALL_COLUMNS:
+            raise ValidationError({"column": f"Unknown column {column!r}."})
+        # The counts' copy of the column is indexed with the scores (and the article, for ties), the
+        # article's is current. The scores are precomputed, so the ranking is read from the index
+        queryset = (
+            self.get_queryset()
+            .filter(status="PUBD", column=column, view_count__column=column)
+            .order_by("-view_count__score", "-view_count__article")
+        )
+        limit = self.paginator.get_page_size(request)
+        serializer = self.get_serializer(queryset[:limit], many=True)
+        return Response({"results": serializer.data})
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Published articles created, updated, unpublished or deleted since ?since= (all of them without it), "
+            "paged. Follow next until it is null, then keep since for the next sync. Answers 410 Gone when the "
+            "token is too old, the client should sync from scratch."
+        ),
+        manual_parameters=[SINCE_PARAMETER, FIELDS_PARAMETER, EXPAND_PARAMETER],
+    )
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        Each change is {"id", "change": "upsert", "article"} or {"id", "change": "tombstone", "reason"}, where
+        the reason is deleted, unpublished or not_entitled (moved to or left in a column the user lost).
+        Only published articles are synced, drafts never are.
+        """
+        since = request.query_params.get("since")
+        state = load_sync_token(since) if since else None
+        article_ids, has_more, state = get_changed_articles(
+            get_sync_columns(request.user), state, self.paginator.get_page_size(request)
+        )
+        articles = self.get_queryset().filter(status="PUBD").in_bulk(article_ids)
+        upserted = [article_id for article_id in article_ids if article_id in articles]
+        serializer = self.get_serializer([articles[article_id] for article_id in upserted], many=True)
+        upserts = dict(zip(upserted, serializer.data))
+        reasons = get_tombstone_reasons([article_id for article_id in article_ids if article_id not in articles])
+        token = dump_sync_token(state)
+        return Response(
+            {
+                "results": [
+                    (
+                        {"id": article_id, "change": "upsert", "article": upserts[article_id]}
+                        if article_id in upserts
+                        else {"id": article_id, "change": "tombstone", "reason": reasons[article_id]}
+                    )
+                    for article_id in article_ids
+                ],
+                "next": replace_query_param(request.build_absolute_uri(), "since", token) if has_more else None,
+                "since": token,
+            }
+        )
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Create articles from an NDJSON body (application/x-ndjson), one article per line (employee only). "
+            "Invalid lines are skipped and reported with their line number."
+        ),
+        request_body=no_body,
+    )
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        # The body is read line by line as it streams in, it never goes through the parsers
+        report = ingest_articles(iter(request.readline, b""), author_id=request.user.pk)
+        return Response(report, status=status.HTTP_200_OK)
+
+    def get_etag(self, *validators):
+        """
+        Return an ETag for the validators and the representation asked for (fields, expand, cursor...).
+        """
+        value = ":".join(str(validator) for validator in (*validators, self.request.get_full_path()))
+        return hashlib.md5(value.encode()).hexdigest()
+
+    def conditional_response(self, etag, last_modified, get_response):
+        """
+        Return 304 Not Modified if the client's copy is still valid, otherwise the response built
+        by `get_response`. The response is only built (and serialized) when actually needed.
+        """
+        etag = quote_etag(etag)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = get_response()
+        return self.patch_validators(response, etag, last_modified)
+
+    async def aconditional_response(self, etag, last_modified, get_response):
+        """
+        Async version of conditional_response, `get_response` returns an awaitable.
+        """
+        etag = quote_etag(etag)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await get_response()
+        return self.patch_validators(response, etag, last_modified)
+
+    @staticmethod
+    def patch_validators(response, etag, last_modified):
+        response.headers["ETag"] = etag
+        if last_modified is not None:
+            response.headers["Last-Modified"] = http_date(last_modified)
+        # Every client must revalidate its own copy
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
 
     @swagger_auto_schema(
         operation_description="Create a new news article (employee only)",
@@ -79,7 +382,39 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    def get_serializer_class(self):
+        if self.action in ("list", "search", "trending"):
+            return NewsArticleSummarySerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method in permissions.SAFE_METHODS:
+            kwargs.setdefault("fields", get_query_param_list(self.request, "fields"))
+            kwargs.setdefault("expand", get_query_param_list(self.request, "expand"))
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
+        queryset = self.get_accessible_queryset()
+        if self.request.method in permissions.SAFE_METHODS:
+            # Only load the columns that will be serialized (the list never sends the article bodies),
+            # and the publication update the feed's cursor is built from
+            serializer = self.get_serializer()
+            queryset = queryset.only(*serializer.get_only_fields(), "updated_at", "last_publication_update_at")
+            if serializer.expanded_fields:
+                queryset = queryset.select_related(*serializer.expanded_fields)
+        return queryset
+
+    @staticmethod
+    def is_client_feed(user):
+        """
+        Return whether the user only sees published articles, filtered by column.
+        """
+        return user.is_authenticated and not user.is_admin and not user.is_employee
+
+    def get_accessible_queryset(self):
+        """
+        Return every article the user is entitled to see.
+        """
         user = self.request.user
         if not user.is_authenticated:
             return NewsArticle.objects.none()
@@ -88,14 +423,16 @@ class NewsArticleViewSet(viewsets.ModelViewSet):
             return NewsArticle.objects.all()
 
         if user.is_employee:
-            return NewsArticle.objects.filter(models.Q(status="PUBD") | models.Q(author=user))
+            return NewsArticle.objects.filter(models.Q(status="PUBD") | models.Q(author_id=user.pk))
 
         return NewsArticle.objects.filter(status="PUBD").filter(
-            models.Q(column__in=user.accessible_columns) | models.Q(column="")  # Empty column means accessible to all
+            # Empty column means accessible to all, clients without a column (e.g. self registered) have None
+            models.Q(column__in=user.accessible_columns or [])
+            | models.Q(column="")
         )
 
     def perform_create(self, serializer):
         if self.request.user.is_authenticated and self.request.user.is_employee:
-            serializer.save(author=self.request.user)
+            serializer.save(author_id=self.request.user.pk)
         else:
             raise NotFound("Not Found")
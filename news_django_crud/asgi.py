@@ -5,12 +5,19 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Served with uvicorn: uvicorn news_django_crud.asgi:application --workers 4
 """
 
 import os
 
 from django.core.asgi import get_asgi_application
 
+from utils.async_views import cancel_event_streams_on_disconnect
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "news_django_crud.settings")
+# News reads don't tie up a thread per request under ASGI (see utils/async_views.py)
+os.environ.setdefault("ASYNC_NEWS_READS", "true")
 
-application = get_asgi_application()
+# Django doesn't stop streaming responses when their client leaves, e.g. the live feed (see news_api/live.py)
+application = cancel_event_streams_on_disconnect(get_asgi_application())
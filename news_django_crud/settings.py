@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "corsheaders",
     "users_api",
@@ -52,6 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings include the other middlewares (see utils/metrics.py)
+    "utils.metrics.RequestMetricsMiddleware",
+    # Admins only, with ?_profile=1 (see utils/profiling.py)
+    "utils.profiling.ProfilingMiddleware",
+    # Samples the plans of slow queries into the admin (see news_api/slow_queries.py)
+    "news_api.slow_queries.SlowQueryMiddleware",
+    # Sends the reads of safe requests to the read replicas (see utils/db_routers.py)
+    "utils.db_routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -102,6 +111,60 @@ DATABASES = {
     }
 }
 
+# Connection pool (see utils/postgresql_pool): with DB_POOL=true, the threads of a process share at most
+# DB_POOL_MAX_SIZE connections, checked before use, instead of holding one each. Requests wait up to
+# DB_POOL_TIMEOUT seconds for one.
+if env.bool("DB_POOL", default=False):
+    DATABASES["default"].update(
+        {
+            "ENGINE": "utils.postgresql_pool",
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": True,
+        }
+    )
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+        "timeout": env.float("DB_POOL_TIMEOUT", default=10.0),
+        "max_idle": 300,
+    }
+
+# Read replicas of the primary (same credentials), comma separated "host" or "host:port". The reads of
+# safe requests go to one of them, see utils/db_routers.py. DB_REPLICA_HOSTS=$DB_HOST adds a second
+# connection to the primary, to try it locally.
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(env.list("DB_REPLICA_HOSTS", default=[]), start=1):
+    host, _, port = replica_host.partition(":")
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{index}")
+DATABASE_ROUTERS = ["utils.db_routers.PrimaryReplicaRouter"]
+# How long (in seconds) a user who just wrote reads from the primary, longer than the replication lag
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory by default, which only fits a single process. Anything else (several workers, the publisher,
+# seed_news, the image variant processes...) needs a cache shared by every process, for the feed versions,
+# token versions, replica pins and profiling reports: set CACHE_BACKEND/CACHE_LOCATION, e.g. to
+# django.core.cache.backends.redis.RedisCache and redis://redis:6379 (see docker-compose.yaml)
+
+CACHES = {
+    "default": {
+        "BACKEND": env("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": env("CACHE_LOCATION", default="news-django-crud"),
+    }
+}
+
+# Cache used for the news feeds and their versions, shared by every process (checked by news_api.W001), and for
+# how long (in seconds) a feed page is kept
+NEWS_FEED_CACHE_ALIAS = "default"
+NEWS_FEED_CACHE_TIMEOUT = env.int("NEWS_FEED_CACHE_TIMEOUT", default=300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -147,6 +210,52 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Image uploads are checked while they stream in, before they are buffered (see utils/uploads.py)
+FILE_UPLOAD_HANDLERS = [
+    "utils.uploads.ImageUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+IMAGE_UPLOAD_MAX_PIXELS = env.int("IMAGE_UPLOAD_MAX_PIXELS", default=40000000)
+
+# Processes generating the resized/WebP variants of uploaded images (see utils/images.py)
+IMAGE_VARIANT_WORKERS = env.int("IMAGE_VARIANT_WORKERS", default=2)
+
+# Bearer token required to read /metrics, which is forbidden when empty
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# How long (in seconds) the reports of ?_profile=store can be downloaded, from the default cache (shared by the workers)
+PROFILE_STORE_TIMEOUT = env.int("PROFILE_STORE_TIMEOUT", default=3600)
+
+# Queries slower than this (in milliseconds, 0 disables it) are recorded with their plan, for a sample of
+# the requests, and only the latest SLOW_QUERY_MAX_RECORDS are kept (see news_api/slow_queries.py)
+SLOW_QUERY_THRESHOLD_MS = env.float("SLOW_QUERY_THRESHOLD_MS", default=200.0)
+SLOW_QUERY_SAMPLE_RATE = env.float("SLOW_QUERY_SAMPLE_RATE", default=0.1)
+SLOW_QUERY_MAX_RECORDS = env.int("SLOW_QUERY_MAX_RECORDS", default=1000)
+
+# Serve the news list and retrieve with async views, enabled by default under ASGI (see news_django_crud/asgi.py)
+ASYNC_NEWS_READS = env.bool("ASYNC_NEWS_READS", default=False)
+
+# Live feed (see news_api/live.py): how often (in seconds) idle streams get a heartbeat and have their token
+# checked, how many events a reconnecting client gets before being told to reload its feed, how many events
+# a slow client may fall behind before its stream is closed, and how long the events are kept (in hours), which
+# is also how long the sync tokens of /news/changes/ stay valid
+LIVE_FEED_HEARTBEAT_SECONDS = env.float("LIVE_FEED_HEARTBEAT_SECONDS", default=15.0)
+LIVE_FEED_RETRY_MS = env.int("LIVE_FEED_RETRY_MS", default=3000)
+LIVE_FEED_MAX_RESUME_EVENTS = env.int("LIVE_FEED_MAX_RESUME_EVENTS", default=1000)
+LIVE_FEED_QUEUE_SIZE = env.int("LIVE_FEED_QUEUE_SIZE", default=1000)
+ARTICLE_EVENT_RETENTION_HOURS = env.int("ARTICLE_EVENT_RETENTION_HOURS", default=168)
+
+# Article views are counted in memory and written every VIEW_COUNTER_FLUSH_SECONDS, or once that many articles
+# were viewed, and a view counts half as much in the trending ranking every TRENDING_HALF_LIFE_HOURS (see
+# news_api/trending.py)
+VIEW_COUNTER_FLUSH_SECONDS = env.float("VIEW_COUNTER_FLUSH_SECONDS", default=10.0)
+VIEW_COUNTER_MAX_PENDING = env.int("VIEW_COUNTER_MAX_PENDING", default=10000)
+TRENDING_HALF_LIFE_HOURS = env.float("TRENDING_HALF_LIFE_HOURS", default=24.0)
+
+# Processes hashing the passwords of bulk provisioned users (see users_api/provisioning.py)
+PASSWORD_HASHING_WORKERS = env.int("PASSWORD_HASHING_WORKERS", default=os.cpu_count() or 1)
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")  # This is where your uploaded files will be stored
 # MEDIA_ROOT = '/path/to/your/media/' # TODO: Change to your media root when in production
@@ -182,11 +291,16 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),  # Increase from default 5 minutes
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),  # Increase from default 1 day
+    "TOKEN_USER_CLASS": "users_api.auth.ClaimsUser",
 }
 
+# How long (in seconds) a worker may keep using a cached token version, see users_api.auth.get_token_version
+TOKEN_VERSION_CACHE_TIMEOUT = env.int("TOKEN_VERSION_CACHE_TIMEOUT", default=60)
+
 # Rest Framework settings
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    # Builds request.user from the token claims instead of loading it from the database
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users_api.auth.StatelessJWTAuthentication",),
 }
 
 # Set the custom user model
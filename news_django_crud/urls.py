@@ -25,6 +25,9 @@ from drf_yasg import openapi
 from rest_framework import permissions
 import os
 
+from utils.metrics import metrics_view
+from utils.profiling import profile_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="News API",
@@ -42,6 +45,8 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("news/", include("news_api.urls")),
     path("users/", include("users_api.urls")),
+    path("metrics", metrics_view, name="metrics"),
+    path("profiles/<str:profile_id>/", profile_view, name="profile"),
     path(
         "favicon.ico",
         RedirectView.as_view(url=os.path.join(settings.BASE_DIR, "favicon.ico"), permanent=True),
@@ -0,0 +1,60 @@
+import pytest
+from news_api.benchmark import (
+    async_news_reads,
+    build_scenarios,
+    compare_reports,
+    create_role_users,
+    pooled_connections,
+    run_async_scenario,
+    run_scenario,
+)
+from news_api.models import NewsArticle
+from utils.global_values import ARTICLE_COLUMNS
+
+
+@pytest.fixture
+def articles():
+    for i, column in enumerate(["", ARTICLE_COLUMNS[0][0], ARTICLE_COLUMNS[1][0]]):
+        NewsArticle.objects.create(
+            title=f"Article {i}",
+            subtitle="Test subtitle",
+            draft_content="Test content",
+            published_content="Test content",
+            original_publication_at="2024-02-24T12:00:00Z",
+            last_publication_update_at="2024-02-24T12:00:00Z",
+            status="PUBD",
+            column=column,
+        )
+
+
+# Requests are sent from other threads (other connections), which only see committed data
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_scenarios(articles):
+    scenarios = {scenario["name"]: scenario for scenario in build_scenarios(create_role_users())}
+    assert len(scenarios["admin:news_detail"]["paths"]) == 3
+    assert len(scenarios["client_info:news_detail"]["paths"]) == 1  # Only the open article
+    assert "admin:users_list" in scenarios and "client_info:users_list" not in scenarios
+
+    result = run_scenario(scenarios["client_pro_one:news_detail"], requests=6, concurrency=2, warmup=2)
+    assert result["requests"] == 6
+    assert result["status_codes"] == {"200": 6}
+    assert result["queries_per_request"]["mean"] >= 1
+    assert 0 < result["latency_ms"]["p50"] <= result["latency_ms"]["p95"] <= result["latency_ms"]["p99"]
+    assert result["resources"]["peak_threads"] >= 2
+
+    with async_news_reads():
+        async_result = run_async_scenario(scenarios["client_pro_one:news_detail"], requests=6, concurrency=2, warmup=2)
+    assert async_result["status_codes"] == {"200": 6}
+    assert async_result["queries_per_request"] == result["queries_per_request"]
+    assert async_result["resources"]["db_connects"] >= 6  # One per request
+
+    with async_news_reads(), pooled_connections(2):
+        pooled_result = run_async_scenario(scenarios["client_pro_one:news_detail"], requests=6, concurrency=2, warmup=2)
+    assert pooled_result["status_codes"] == {"200": 6}
+    assert pooled_result["resources"]["db_connects"] <= 2
+
+    baseline = {
+        "scenarios": [{**result, "latency_ms": {**result["latency_ms"], "p95": result["latency_ms"]["p95"] / 2}}]
+    }
+    [change] = compare_reports(baseline, {"scenarios": [result]})
+    assert change["p95_change"] == pytest.approx(1.0)
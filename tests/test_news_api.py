@@ -1,9 +1,42 @@
+import asyncio
+import json
+import marshal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from io import BytesIO, StringIO
+
 import pytest
+from PIL import Image
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.asgi import get_asgi_application
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from django.test import AsyncClient
 from django.contrib.auth import get_user_model
-from news_api.models import NewsArticle
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from news_api.benchmark import async_news_reads
+from news_api.cache import news_feed_cache
+from news_api.changes import trim_article_events
+from news_api.live import get_listener
+from news_api.management.commands import seed_news
+from news_api.models import ArticleEvent, ArticleViewCount, NewsArticle, SlowQuery
+from news_api import publishing
+from news_api.publishing import publish_due_articles
+from news_api.slow_queries import explain
+from news_api.trending import ViewCounter, view_counter
+from utils.async_views import cancel_event_streams_on_disconnect
+from utils import images
+from utils.images import generate_image_variants, save_image_variants
+from utils.metrics import registry
+from utils.postgresql_pool.base import close_pools
 from utils.global_values import USER_PROFILES, ARTICLE_COLUMNS, PLANS, ARTICLE_STATUS
 
 User = get_user_model()  # Get the user model dynamically
@@ -14,6 +47,12 @@ def api_client():
     return APIClient()
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # The feed cache outlives the test database transactions
+    cache.clear()
+
+
 @pytest.fixture
 def admin_user():
     return User.objects.create_user(
@@ -102,6 +141,41 @@ def draft_article(employee_user):
     )
 
 
+@pytest.fixture
+def replica_database(settings):
+    """
+    A second connection to the test database, used as the read replica.
+    """
+    connections.settings["replica"] = dict(connections["default"].settings_dict)
+    settings.DATABASE_REPLICAS = ["replica"]
+    yield connections["replica"]
+    connections["replica"].close()
+    del connections["replica"]
+    del connections.settings["replica"]
+
+
+@pytest.fixture
+def pooled_database():
+    """
+    A connection to the test database through a pool of two connections (see utils/postgresql_pool).
+    """
+    connections.settings["pooled"] = {
+        **connections["default"].settings_dict,
+        "ENGINE": "utils.postgresql_pool",
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            **connections["default"].settings_dict["OPTIONS"],
+            "pool": {"min_size": 1, "max_size": 2, "timeout": 5},
+        },
+    }
+    yield connections["pooled"]
+    connections["pooled"].close()
+    close_pools(connections["pooled"].settings_dict["NAME"])
+    del connections["pooled"]
+    del connections.settings["pooled"]
+
+
 @pytest.mark.django_db
 class TestNewsAPI:
     def test_client_can_read_accessible_published(self, api_client, client_user, published_article):
@@ -194,6 +268,27 @@ class TestNewsAPI:
         response = api_client.get(url)
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
+    def test_client_without_columns_reads_open_articles(self, api_client, published_article):
+        User.objects.create_user(
+            email="info@test.com", password="client_password", name="Info", user_profile=USER_PROFILES[1][0]
+        )
+        open_article = NewsArticle.objects.create(
+            title="Open Article",
+            subtitle="Test subtitle",
+            draft_content="Test content",
+            published_content="Test content",
+            original_publication_at="2024-02-24T12:00:00Z",
+            last_publication_update_at="2024-02-24T12:00:00Z",
+            status="PUBD",
+            column="",
+        )
+
+        token = self._get_token(api_client, "info@test.com", "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.get(reverse("newsarticle-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert [article["id"] for article in response.data["results"]] == [open_article.id]
+
     def test_employee_article_access_control(self, api_client, employee_user, employee_user2, admin_user):
         # Create an article by employee_user
         article = NewsArticle.objects.create(
@@ -243,6 +338,1083 @@ class TestNewsAPI:
         assert response.status_code == status.HTTP_200_OK
         assert response.data["title"] == "Updated by admin"
 
+    def test_list_is_cursor_paginated(self, api_client, client_user):
+        # Several articles share a timestamp, so the id has to break the ties
+        for i in range(7):
+            NewsArticle.objects.create(
+                title=f"Article {i}",
+                subtitle="Test subtitle",
+                draft_content="Test content",
+                published_content="Test content",
+                original_publication_at="2024-02-24T12:00:00Z",
+                last_publication_update_at=f"2024-02-2{i // 3}T12:00:00Z",
+                author=None,
+                status=ARTICLE_STATUS[1][0],
+                column=ARTICLE_COLUMNS[0][0],  # POW column
+            )
+        expected = list(NewsArticle.objects.order_by("-last_publication_update_at", "-id").values_list("id", flat=True))
+
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        url = reverse("newsarticle-list") + "?page_size=3"
+        seen = []
+        pages = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data["results"]) <= 3
+            seen += [article["id"] for article in response.data["results"]]
+            pages.append(response.data)
+            url = response.data["next"]
+        assert seen == expected
+        assert pages[0]["previous"] is None
+
+        # Walking back from the last page returns the previous page unchanged
+        response = api_client.get(pages[-1]["previous"])
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == pages[-2]["results"]
+
+    def test_list_rejects_invalid_cursor(self, api_client, client_user):
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        response = api_client.get(reverse("newsarticle-list"), {"cursor": "not-a-cursor"})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_omits_article_bodies(self, api_client, client_user, published_article):
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        response = api_client.get(reverse("newsarticle-list"))
+        assert response.status_code == status.HTTP_200_OK
+        article = response.data["results"][0]
+        assert article["title"] == published_article.title
+        assert "draft_content" not in article
+        assert "published_content" not in article
+
+        response = api_client.get(reverse("newsarticle-detail", kwargs={"pk": published_article.pk}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["published_content"] == published_article.published_content
+
+    def test_list_sparse_fieldset_and_author_expansion(self, api_client, admin_user, employee_user, draft_article):
+        NewsArticle.objects.create(
+            title="Admin Article",
+            subtitle="Test subtitle",
+            draft_content="Test content",
+            published_content="Test content",
+            original_publication_at="2024-02-24T12:00:00Z",
+            last_publication_update_at="2024-02-24T12:00:00Z",
+            author=admin_user,
+            status=ARTICLE_STATUS[1][0],
+            column=ARTICLE_COLUMNS[0][0],  # POW column
+        )
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+
+        response = api_client.get(url, {"fields": "id,title,column"})
+        assert response.status_code == status.HTTP_200_OK
+        assert all(set(article) == {"id", "title", "column"} for article in response.data["results"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url, {"fields": "id,title,author", "expand": "author"})
+        assert response.status_code == status.HTTP_200_OK
+        authors = {article["title"]: article["author"] for article in response.data["results"]}
+        assert authors["Admin Article"] == {
+            "id": admin_user.id,
+            "name": admin_user.name,
+            "profile_picture": None,
+            "profile_picture_variants": None,
+        }
+        assert authors["Draft Article"]["name"] == employee_user.name
+        # The authors come with the articles, not from one query each
+        article_queries = [q for q in queries.captured_queries if 'FROM "news_api_newsarticle"' in q["sql"]]
+        assert len(article_queries) == 1
+        assert "published_content" not in article_queries[0]["sql"]
+
+    def test_client_feed_is_cached_per_column(
+        self, api_client, client_user, published_article, django_capture_on_commit_callbacks
+    ):
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+
+        response = api_client.get(url)
+        assert [article["id"] for article in response.data["results"]] == [published_article.id]
+
+        hits = news_feed_cache.stats()["hits"]
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url)
+        assert news_feed_cache.stats()["hits"] == hits + 1
+        assert not [q for q in queries.captured_queries if "news_api_newsarticle" in q["sql"]]
+        assert [article["id"] for article in response.data["results"]] == [published_article.id]
+
+        # Publishing in a column the client can't see keeps its feed cached
+        taxes_article = NewsArticle.objects.create(
+            title="Taxes Article",
+            subtitle="Test subtitle",
+            draft_content="Test content",
+            published_content="Test content",
+            original_publication_at="2024-02-25T12:00:00Z",
+            last_publication_update_at="2024-02-25T12:00:00Z",
+            author=None,
+            status=ARTICLE_STATUS[1][0],
+            column=ARTICLE_COLUMNS[1][0],  # TAX column
+        )
+        api_client.get(url)
+        assert news_feed_cache.stats()["hits"] == hits + 2
+
+        # Moving it to the client's column invalidates the feed, once committed
+        with django_capture_on_commit_callbacks(execute=True):
+            taxes_article.column = ARTICLE_COLUMNS[0][0]  # POW column
+            taxes_article.save()
+            api_client.get(url)
+            assert news_feed_cache.stats()["hits"] == hits + 3
+        response = api_client.get(url)
+        assert news_feed_cache.stats()["hits"] == hits + 3
+        assert [article["id"] for article in response.data["results"]] == [taxes_article.id, published_article.id]
+
+        # And unpublishing it too
+        taxes_article = NewsArticle.objects.get(pk=taxes_article.pk)
+        taxes_article.status = ARTICLE_STATUS[0][0]
+        with django_capture_on_commit_callbacks(execute=True):
+            taxes_article.save()
+        response = api_client.get(url)
+        assert [article["id"] for article in response.data["results"]] == [published_article.id]
+
+        # Renaming an author invalidates the feeds that may nest them (?expand=author)
+        response = api_client.get(url, {"expand": "author"})
+        assert response.data["results"][0]["author"]["name"] == published_article.author.name
+        with django_capture_on_commit_callbacks(execute=True):
+            published_article.author.name = "Renamed Author"
+            published_article.author.save()
+        response = api_client.get(url, {"expand": "author"})
+        assert response.data["results"][0]["author"]["name"] == "Renamed Author"
+
+        stats = registry.render()
+        assert f'news_feed_cache_requests_total{{result="hit"}} {news_feed_cache.stats()["hits"]}' in stats
+        assert "news_feed_cache_invalidations_total" in stats
+
+    def test_retrieve_conditional_get(self, api_client, client_user, published_article):
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-detail", kwargs={"pk": published_article.pk})
+
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response.headers["ETag"]
+        assert response.headers["Last-Modified"]
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+
+        published_article.title = "Updated Title"
+        published_article.save()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["title"] == "Updated Title"
+
+    def test_list_conditional_get(
+        self, api_client, employee_user, published_article, draft_article, django_capture_on_commit_callbacks
+    ):
+        token = self._get_token(api_client, employee_user.email, "employee_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert "Last-Modified" not in response.headers
+        etag = response.headers["ETag"]
+
+        # Validated without querying the feed
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not [query for query in queries if "news_api_newsarticle" in query["sql"]]
+
+        # Another representation of the same feed has its own ETag
+        response = api_client.get(url, {"fields": "id"}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+        # Deleting a draft other than the latest article changes the ETag too
+        with django_capture_on_commit_callbacks(execute=True):
+            draft_article.delete()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert [article["id"] for article in response.data["results"]] == [published_article.id]
+
+    def test_cached_client_feed_conditional_get(self, api_client, client_user, published_article):
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+
+        etag = api_client.get(url).headers["ETag"]
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_search_respects_access_control(self, api_client, client_user, employee_user):
+        def create_article(title, column, status=ARTICLE_STATUS[1][0]):
+            return NewsArticle.objects.create(
+                title=title,
+                subtitle="Cobertura completa",
+                draft_content="Texto",
+                published_content="Texto",
+                original_publication_at="2024-02-24T12:00:00Z",
+                last_publication_update_at="2024-02-24T12:00:00Z",
+                author=employee_user,
+                status=status,
+                column=column,
+            )
+
+        power = create_article("Novos impostos para a agência de energia", ARTICLE_COLUMNS[0][0])  # POW column
+        create_article("Imposto muda em março", ARTICLE_COLUMNS[1][0])  # TAX column
+        draft = create_article("Rascunho sobre o imposto", ARTICLE_COLUMNS[0][0], status=ARTICLE_STATUS[0][0])
+        create_article("Mercado de trabalho", "")
+        url = reverse("newsarticle-search")
+
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.get(url, {"q": "imposto"})
+        assert response.status_code == status.HTTP_200_OK
+        assert [article["id"] for article in response.data["results"]] == [power.id]
+        assert "published_content" not in response.data["results"][0]
+
+        token = self._get_token(api_client, employee_user.email, "employee_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.get(url, {"q": "imposto"})
+        assert len(response.data["results"]) == 3
+
+        # The search vector follows the article edits
+        draft.title = "Rascunho sobre o mercado"
+        draft.save()
+        response = api_client.get(url, {"q": "mercado"})
+        assert {article["title"] for article in response.data["results"]} == {"Mercado de trabalho", draft.title}
+
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_image_variants_fall_back_to_original(self, api_client, client_user, published_article, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        image = BytesIO()
+        Image.new("RGB", (1600, 900), "red").save(image, format="JPEG")
+        published_article.image.save("cover.jpg", ContentFile(image.getvalue()))
+
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-detail", kwargs={"pk": published_article.pk})
+
+        # Not processed yet: every variant is the original image
+        response = api_client.get(url)
+        assert set(response.data["image_variants"].values()) == {response.data["image"]}
+
+        variants = generate_image_variants(published_article.image.name)
+        assert save_image_variants("news_api.NewsArticle", published_article.pk, "image", "image_variants", variants)
+        response = api_client.get(url)
+        assert response.data["image_variants"]["small_webp"].endswith(".webp")
+        assert response.data["image_variants"]["medium"].endswith(".jpg")
+        with Image.open(tmp_path / variants["small"]) as small:
+            assert small.size == (320, 180)
+        with Image.open(tmp_path / variants["webp"]) as webp:
+            assert (webp.format, webp.size) == ("WEBP", (1600, 900))
+
+    @pytest.mark.django_db(transaction=True)
+    def test_image_variants_are_saved_by_the_uploading_process(
+        self, api_client, client_user, published_article, settings, tmp_path, monkeypatch
+    ):
+        settings.MEDIA_ROOT = tmp_path
+        # Threads instead of processes, which wouldn't see the settings of the test
+        executor = ThreadPoolExecutor(1)
+        monkeypatch.setattr(images, "get_executor", lambda: executor)
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+        assert api_client.get(url).data["results"][0]["image_variants"] is None
+
+        image = BytesIO()
+        Image.new("RGB", (800, 600), "blue").save(image, format="PNG")
+        published_article.image.save("cover.png", ContentFile(image.getvalue()))
+        executor.shutdown(wait=True)
+
+        # Saved here, the cached feed was invalidated
+        variants = api_client.get(url).data["results"][0]["image_variants"]
+        assert variants["small_webp"].endswith(".webp")
+        assert variants["small"] != variants["medium"]
+
+    def test_image_upload_is_checked_while_streaming(self, api_client, employee_user, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.IMAGE_UPLOAD_MAX_PIXELS = 1000
+        token = self._get_token(api_client, employee_user.email, "employee_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+        data = {
+            "title": "New Article",
+            "subtitle": "Test subtitle",
+            "draft_content": "Draft content",
+            "published_content": "Published content",
+            "original_publication_at": "2024-02-24T12:00:00Z",
+            "last_publication_update_at": "2024-02-24T12:00:00Z",
+            "status": "DRAF",
+            "column": "POW",
+        }
+
+        def png(size, padding=b""):
+            image = BytesIO()
+            Image.new("RGB", size, "red").save(image, format="PNG")
+            return SimpleUploadedFile("cover.png", image.getvalue() + padding, content_type="image/png")
+
+        response = api_client.post(url, {**data, "image": png((20, 20))}, format="multipart")
+        assert response.status_code == status.HTTP_201_CREATED
+
+        fake = SimpleUploadedFile("cover.jpg", b"<html>not an image</html>", content_type="image/jpeg")
+        response = api_client.post(url, {**data, "image": fake}, format="multipart")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Unsupported image format" in response.data["detail"]
+
+        response = api_client.post(url, {**data, "image": png((100, 100))}, format="multipart")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "100x100" in response.data["detail"]
+
+        response = api_client.post(url, {**data, "image": png((20, 20), b"\0" * 10485760)}, format="multipart")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Max file size" in response.data["detail"]
+        assert NewsArticle.objects.count() == 1
+
+    def test_employee_can_bulk_ingest_ndjson(
+        self, api_client, employee_user, client_user, django_capture_on_commit_callbacks
+    ):
+        article = {
+            "title": "Bulk Article",
+            "subtitle": "Test subtitle",
+            "draft_content": "Draft content",
+            "published_content": "Published content",
+            "original_publication_at": "2024-02-24T12:00:00Z",
+            "last_publication_update_at": "2024-02-24T12:00:00Z",
+            "status": "PUBD",
+            "column": "POW",
+        }
+        lines = [
+            json.dumps(article),
+            "{not json",
+            json.dumps({**article, "title": "Second"}),
+            json.dumps({**article, "status": "NOPE"}),
+            "",
+            json.dumps({**article, "title": "Third", "status": "DRAF"}),
+            json.dumps({**article, "publish_at": "2024-02-30T12:00:00Z"}),
+            "[]",
+        ]
+        body = "\n".join(lines).encode()
+        url = reverse("newsarticle-bulk")
+
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        feed = api_client.get(reverse("newsarticle-list"))  # Cached, must be invalidated by the ingest
+        assert feed.data["results"] == []
+        response = api_client.generic("POST", url, body, content_type="application/x-ndjson")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        token = self._get_token(api_client, employee_user.email, "employee_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.generic("POST", url, body, content_type="application/x-ndjson")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 3
+        assert response.data["failed"] == 4
+        errors = response.data["errors"]
+        assert [error["line"] for error in errors] == [2, 4, 7, 8]
+        assert errors[0]["errors"]["non_field_errors"][0].endswith("at column 2")
+        assert set(errors[1]["errors"]) == {"status"}
+        assert set(errors[2]["errors"]) == {"publish_at"}
+        assert errors[3]["errors"] == {"non_field_errors": ["Expected a JSON object"]}
+        assert set(NewsArticle.objects.values_list("title", "author_id")) == {
+            ("Bulk Article", employee_user.id),
+            ("Second", employee_user.id),
+            ("Third", employee_user.id),
+        }
+
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        feed = api_client.get(reverse("newsarticle-list"))
+        assert {article["title"] for article in feed.data["results"]} == {"Bulk Article", "Second"}
+
+    def test_requests_report_server_timing_and_metrics(self, api_client, admin_user, published_article, settings):
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse("newsarticle-list"))
+        timing = dict(entry.split(";", 1) for entry in response.headers["Server-Timing"].split(", "))
+        assert set(timing) == {"db", "serializer", "total"}
+        assert f'desc="{len(queries)} queries"' in timing["db"]
+        api_client.get(reverse("newsarticle-detail", kwargs={"pk": published_article.pk}))
+
+        api_client.credentials()
+        settings.METRICS_TOKEN = ""
+        assert api_client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ").status_code == status.HTTP_403_FORBIDDEN
+        settings.METRICS_TOKEN = "secret"
+        assert api_client.get(reverse("metrics")).status_code == status.HTTP_403_FORBIDDEN
+        response = api_client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        metrics = response.content.decode()
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        labels = 'view="NewsArticleViewSet.list",method="GET"'
+        assert f'http_requests_total{{{labels},status="200"}}' in metrics
+        assert f'http_request_db_queries_bucket{{{labels},le="2"}}' in metrics
+        assert 'view="NewsArticleViewSet.retrieve"' in metrics
+        assert "# TYPE http_request_serializer_duration_seconds histogram" in metrics
+        assert 'view="metrics"' not in metrics
+
+    def test_admin_can_profile_a_request(self, api_client, admin_user, client_user, published_article):
+        url = reverse("newsarticle-list")
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.get(url, {"_profile": "1"})
+        assert "results" in response.json()  # Not profiled
+
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        for value in ("0", "false"):
+            assert "results" in api_client.get(url, {"_profile": value}).json()
+        report = api_client.get(url, {"_profile": "1"}).json()
+        assert report["status"] == 200
+        breakdown = report["breakdown"]
+        assert breakdown["handler"]["name"] == "NewsArticleViewSet.list"
+        assert breakdown["handler"]["calls"] == 1
+        assert breakdown["permissions"]["IsEmployeeOrReadOnly.has_permission"]["calls"] == 1
+        assert breakdown["serializers"]["to_representation"]["calls"] == 1
+        assert breakdown["sql"]["queries"] == len(report["sql"]) > 0
+        assert report["functions"]
+
+        response = api_client.get(
+            reverse("newsarticle-detail", kwargs={"pk": published_article.pk}), HTTP_X_PROFILE="store"
+        )
+        assert response.json()["id"] == published_article.pk
+        profile_url = reverse("profile", kwargs={"profile_id": response["X-Profile-Id"]})
+        report = api_client.get(profile_url).json()
+        assert report["breakdown"]["handler"]["name"] == "NewsArticleViewSet.retrieve"
+        assert report["breakdown"]["permissions"]["IsEmployeeOrReadOnly.has_object_permission"]["calls"] == 1
+        stats = marshal.loads(b"".join(api_client.get(profile_url, {"format": "pstats"})))
+        assert any(name == "retrieve" for _, _, name in stats)
+
+        api_client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self._get_token(api_client, client_user.email, 'client_password')}"
+        )
+        assert api_client.get(profile_url).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_slow_queries_are_recorded_with_their_plan(self, api_client, settings, admin_user, published_article):
+        settings.SLOW_QUERY_THRESHOLD_MS = 0.001
+        settings.SLOW_QUERY_SAMPLE_RATE = 1.0
+        SlowQuery.objects.all().delete()
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        # The parameters of the users' queries (emails, password hashes) aren't recorded
+        user_queries = SlowQuery.objects.filter(sql__contains='"users_api_user"').exclude(params="")
+        assert user_queries and all(query.params == "<redacted>" for query in user_queries)
+        SlowQuery.objects.all().delete()
+
+        # Taken once the response is sent, the test client closes it
+        assert api_client.get(reverse("newsarticle-list")).status_code == status.HTTP_200_OK
+        feed_queries = SlowQuery.objects.filter(view="NewsArticleViewSet.list", sql__contains='"news_api_newsarticle"')
+        assert feed_queries and all(query.method == "GET" for query in feed_queries)
+        assert all(query.analyzed and "actual time" in query.plan for query in feed_queries)
+
+        data = {
+            "title": "Slow",
+            "subtitle": "Slow",
+            "draft_content": "Slow",
+            "published_content": "Slow",
+            "original_publication_at": "2024-02-24T12:00:00Z",
+            "last_publication_update_at": "2024-02-24T12:00:00Z",
+            "status": "DRAF",
+        }
+        assert api_client.post(reverse("newsarticle-list"), data, format="json").status_code == 201
+        assert NewsArticle.objects.filter(title="Slow").count() == 1  # Writes are explained, not run again
+        insert = SlowQuery.objects.get(view="NewsArticleViewSet.create", sql__startswith="INSERT")
+        assert not insert.analyzed and "actual time" not in insert.plan
+
+        # Volatile functions aren't run again
+        assert (
+            explain("default", "SELECT nextval(pg_get_serial_sequence('news_api_slowquery', 'id'))", None)[1] is False
+        )
+        assert explain("default", "SELECT upper(%s)", ["slow"])[1] is True
+
+        settings.SLOW_QUERY_MAX_RECORDS = 2
+        api_client.get(reverse("newsarticle-list"))
+        assert SlowQuery.objects.count() == 2
+
+        settings.SLOW_QUERY_SAMPLE_RATE = 0.0
+        SlowQuery.objects.all().delete()
+        api_client.get(reverse("newsarticle-list"))
+        assert not SlowQuery.objects.exists()
+
+    def test_async_reads_match_the_sync_views(
+        self, api_client, admin_user, client_user, published_article, draft_article
+    ):
+        tokens = {
+            user: self._get_token(api_client, user.email, password)
+            for user, password in ((admin_user, "admin_password"), (client_user, "client_password"))
+        }
+        requests = [
+            (reverse("newsarticle-list"), {"fields": "title", "page_size": 1}),
+            (reverse("newsarticle-list"), {"expand": "author"}),
+            (reverse("newsarticle-detail", kwargs={"pk": published_article.pk}), {}),
+            (reverse("newsarticle-detail", kwargs={"pk": draft_article.pk}), {}),
+        ]
+        expected = {}
+        for user, token in tokens.items():
+            api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            for url, params in requests:
+                response = api_client.get(url, params)
+                expected[user, url, str(params)] = (
+                    response.status_code,
+                    response.content,
+                    response.get("ETag"),
+                    response["Allow"],
+                )
+
+        client = AsyncClient()
+
+        def send(method, *args, **kwargs):
+            async def request():
+                return await getattr(client, method)(*args, **kwargs)
+
+            return async_to_sync(request)()
+
+        with async_news_reads():
+            for user, token in tokens.items():
+                headers = {"Authorization": f"Bearer {token}"}
+                for url, params in requests:
+                    response = send("get", url, params, headers=headers)
+                    etag = response.get("ETag")
+                    actual = (response.status_code, response.content, etag, response["Allow"])
+                    assert actual == expected[user, url, str(params)]
+                    if etag:
+                        response = send("get", url, params, headers={**headers, "If-None-Match": etag})
+                        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+            # Other methods and actions are served by the DRF views
+            headers = {"Authorization": f"Bearer {tokens[admin_user]}"}
+            data = {
+                "title": "Async",
+                "subtitle": "Async",
+                "draft_content": "Async",
+                "published_content": "Async",
+                "original_publication_at": "2024-02-24T12:00:00Z",
+                "last_publication_update_at": "2024-02-24T12:00:00Z",
+                "status": "DRAF",
+            }
+            response = send("post", reverse("newsarticle-list"), data, content_type="application/json", headers=headers)
+            assert response.status_code == status.HTTP_201_CREATED
+            response = send("get", reverse("newsarticle-search"), {"q": "Async"}, headers=headers)
+            assert response.json()["results"][0]["title"] == "Async"
+
+            response = send("get", reverse("newsarticle-list"))
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+            assert response["WWW-Authenticate"] == 'Bearer realm="api"'
+            response = send("get", reverse("newsarticle-detail", kwargs={"pk": "invalid"}), headers=headers)
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # The replica is another connection, which only sees committed data
+    @pytest.mark.django_db(transaction=True)
+    def test_reads_go_to_the_replica_unless_the_user_just_wrote(
+        self, api_client, replica_database, employee_user, client_user, draft_article
+    ):
+        def get_article_queries(url, **params):
+            with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(replica_database) as replica:
+                response = api_client.get(url, params)
+            assert response.status_code == status.HTTP_200_OK
+            return [
+                [query["sql"] for query in queries if "news_api_newsarticle" in query["sql"]]
+                for queries in (primary, replica)
+            ]
+
+        detail_url = reverse("newsarticle-detail", kwargs={"pk": draft_article.pk})
+        token = self._get_token(api_client, employee_user.email, "employee_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        primary, replica = get_article_queries(detail_url)
+        assert not primary and replica
+
+        with CaptureQueriesContext(connection) as primary:
+            response = api_client.patch(detail_url, {"title": "Updated"}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert any(query["sql"].startswith("UPDATE") for query in primary)
+
+        # Pinned to the primary for a while after writing
+        primary, replica = get_article_queries(detail_url)
+        assert primary and not replica
+        cache.clear()
+        with CaptureQueriesContext(replica_database) as replica:
+            primary, _ = get_article_queries(detail_url)
+        assert not primary
+        # But not the token version, which could be older there than a revocation
+        assert not [query for query in replica if "users_api_user" in query["sql"]]
+        assert [query for query in replica if "news_api_newsarticle" in query["sql"]]
+
+        # The staff feeds are read from the primary, their ETag is bumped once writes are committed there
+        primary, replica = get_article_queries(reverse("newsarticle-list"))
+        assert primary and not replica
+
+        # Cached client feeds are read from the primary
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        primary, replica = get_article_queries(reverse("newsarticle-list"))
+        assert primary and not replica
+
+    @pytest.mark.django_db(transaction=True)
+    def test_pooled_connections_are_reused_checked_and_measured(self, pooled_database):
+        def get_backend_pid():
+            # Connections are per thread
+            with connections["pooled"].cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                return cursor.fetchone()[0]
+
+        pids = set()
+        for _ in range(5):
+            pids.add(get_backend_pid())
+            pooled_database.close()  # Back to the pool
+        assert len(pids) <= 2
+
+        # Connections that died while idle are replaced before being handed out
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(pid) FROM unnest(%s) AS pid", [list(pids)])
+        assert get_backend_pid() not in pids
+
+        # This thread and another one hold both connections: a third one waits for the timeout, then fails
+        pooled_database.pool.timeout = 0.2
+        errors = []
+
+        def use_connection():
+            try:
+                get_backend_pid()
+            except OperationalError as error:
+                errors.append(error)
+
+        for _ in range(2):
+            thread = threading.Thread(target=use_connection)
+            thread.start()
+            thread.join()
+        assert len(errors) == 1
+        pooled_database.close()
+
+        metrics = registry.render()
+        assert 'db_pool_max_size{database="pooled"} 2' in metrics
+        assert 'db_pool_requests_errors_total{database="pooled"} 1' in metrics
+        assert 'db_pool_wait_seconds_count{database="pooled"}' in metrics
+
+    # The lock is taken from another connection, which only sees committed data
+    @pytest.mark.django_db(transaction=True)
+    def test_scheduled_articles_are_published_in_batches(
+        self, api_client, client_user, published_article, draft_article
+    ):
+        now = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+        draft_article.column = "POW"
+        draft_article.publish_at = now - timedelta(minutes=1)
+        draft_article.save()
+        published_article.draft_content = "Updated content"
+        published_article.publish_at = now
+        published_article.save()
+        embargoed = NewsArticle.objects.create(
+            title="Embargoed",
+            subtitle="Embargoed subtitle",
+            draft_content="Embargoed content",
+            published_content="",
+            original_publication_at=now,
+            last_publication_update_at=now,
+            status="DRAF",
+            column="POW",
+            publish_at=now + timedelta(hours=1),
+        )
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert [article["id"] for article in api_client.get(reverse("newsarticle-list")).data["results"]] == [
+            published_article.pk
+        ]
+
+        # A batch locked by another worker is skipped
+        published = []
+        with transaction.atomic():
+            NewsArticle.objects.select_for_update().get(pk=draft_article.pk)
+            thread = threading.Thread(target=lambda: published.append(publish_due_articles(batch_size=1, now=now)))
+            thread.start()
+            thread.join()
+        assert published == [1]
+        published_article.refresh_from_db()
+        assert published_article.published_content == "Updated content"
+        assert published_article.publish_at is None
+        assert published_article.last_publication_update_at == now
+        assert published_article.original_publication_at == datetime(2024, 2, 24, 12, tzinfo=timezone.utc)
+
+        assert publish_due_articles(batch_size=1, now=now) == 1
+        assert publish_due_articles(batch_size=1, now=now) == 0
+        draft_article.refresh_from_db()
+        assert (draft_article.status, draft_article.published_content) == ("PUBD", "Draft content")
+        assert draft_article.original_publication_at == draft_article.last_publication_update_at
+        assert draft_article.last_publication_update_at == now - timedelta(minutes=1)
+        embargoed.refresh_from_db()
+        assert (embargoed.status, embargoed.publish_at) == ("DRAF", now + timedelta(hours=1))
+
+        # The cached feed was invalidated
+        feed = api_client.get(reverse("newsarticle-list")).data["results"]
+        assert [article["id"] for article in feed] == [published_article.pk, draft_article.pk]
+
+    def test_publisher_keeps_running_after_database_errors(self, monkeypatch):
+        results = [OperationalError("the connection was lost"), 2, 0]
+        closed = []
+
+        def publish(batch_size):
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        monkeypatch.setattr(publishing, "publish_due_articles", publish)
+        monkeypatch.setattr(publishing, "close_old_connections", lambda: closed.append(True))
+        trimmed = []
+        monkeypatch.setattr(publishing, "trim_article_events", lambda: trimmed.append(True))
+        batches = []
+        publishing.run_publisher(
+            batch_size=2, interval=0, stop=lambda: not results, on_batch=lambda published, _: batches.append(published)
+        )
+        assert batches == [2]
+        assert closed == [True]
+        # Every TRIM_INTERVAL, from the first batch on
+        assert trimmed == [True]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_live_feed_streams_the_articles_of_the_readable_columns(
+        self, api_client, settings, client_user, published_article, draft_article
+    ):
+        settings.LIVE_FEED_HEARTBEAT_SECONDS = 0.2
+        token = self._get_token(api_client, client_user.email, "client_password")
+        url = reverse("news-live")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert api_client.get(url).status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+        def publish(article, **changes):
+            for field, value in {"status": "PUBD", **changes}.items():
+                setattr(article, field, value)
+            article.save()
+
+        def revoke():
+            client_user.accessible_columns = ["POW", "TAX"]
+            client_user.save()
+
+        async def read_events(stream, count):
+            events = []
+            while len(events) < count:
+                chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+                if chunk.startswith("id:"):
+                    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+                    events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])["id"]))
+            return events
+
+        async def scenario():
+            client = AsyncClient()
+            response = await client.get(url, {"access_token": "invalid"})
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+            response = await client.get(url, headers={"Authorization": f"Bearer {token}"})
+            assert response["Content-Type"] == "text/event-stream"
+            stream = aiter(response.streaming_content)
+            assert await anext(stream) == b"retry: 3000\n\n"
+            listener = get_listener()
+            await asyncio.wait_for(listener.ready.wait(), 5)
+
+            # The client reads POW and the open articles, not TAX
+            await sync_to_async(publish)(draft_article)
+            await sync_to_async(publish)(published_article, title="Updated title")
+            await sync_to_async(publish)(draft_article, column="")
+            await sync_to_async(publish)(published_article, column="TAX")
+            events = await read_events(stream, 3)
+            assert [event[1:] for event in events] == [
+                ("update", published_article.pk),
+                ("publish", draft_article.pk),
+                ("unpublish", published_article.pk),
+            ]
+            assert await asyncio.wait_for(anext(stream), 5) == b": heartbeat\n\n"
+
+            # Resumed after the first event
+            headers = {"Authorization": f"Bearer {token}", "Last-Event-ID": str(events[0][0])}
+            resumed = aiter((await client.get(url, headers=headers)).streaming_content)
+            await anext(resumed)
+            assert await read_events(resumed, 2) == events[1:]
+
+            # Under ASGI, the stream stops when the client leaves
+            application = cancel_event_streams_on_disconnect(get_asgi_application())
+            disconnected = asyncio.Event()
+            messages = []
+
+            async def receive():
+                if not messages:
+                    return {"type": "http.request", "body": b""}
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+                if message.get("body", b"").startswith(b"retry"):
+                    disconnected.set()
+
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "path": url,
+                "query_string": f"access_token={token}".encode(),
+                "headers": [(b"host", b"testserver")],
+            }
+            subscriptions = len(listener.subscriptions)
+            await asyncio.wait_for(application(scope, receive, send), 5)
+            assert messages[0]["status"] == status.HTTP_200_OK
+            assert len(listener.subscriptions) == subscriptions
+
+            # A listener that stopped is started again by the next client
+            task = listener.task
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert listener.task is None and not listener.ready.is_set()
+            listener.unsubscribe(listener.subscribe(None))
+            await asyncio.wait_for(listener.ready.wait(), 5)
+
+            # The stream ends once the token is revoked, even when events keep it busy
+            busy = aiter((await client.get(url, headers={"Authorization": f"Bearer {token}"})).streaming_content)
+            await anext(busy)
+            await sync_to_async(publish)(published_article, column="")
+            await anext(busy)
+            await sync_to_async(revoke)()
+
+            async def read_until_closed():
+                async for chunk in busy:
+                    assert chunk.startswith(b"id:")
+                    await sync_to_async(publish)(published_article, title=f"Title {time.monotonic()}")
+
+            await asyncio.wait_for(read_until_closed(), 5)
+            await listener.stop()
+
+        async_to_sync(scenario)()
+
+        # The events are also kept for the clients that resume later
+        events = ArticleEvent.objects.filter(article_id=draft_article.pk)
+        assert list(events.values_list("kind", "column", "previous_column")) == [
+            ("publish", "TAX", "TAX"),
+            ("update", "", "TAX"),
+        ]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_changes_sync_what_changed_with_tombstones(
+        self, api_client, settings, client_user, published_article, draft_article
+    ):
+        def create_article(title, column, status="PUBD"):
+            return NewsArticle.objects.create(
+                title=title,
+                subtitle=title,
+                draft_content=title,
+                published_content=title,
+                original_publication_at="2024-02-24T12:00:00Z",
+                last_publication_update_at="2024-02-24T12:00:00Z",
+                status=status,
+                column=column,
+            )
+
+        def sync(since=None):
+            changes = {}
+            params = {"page_size": 1, **({"since": since} if since else {})}
+            url = reverse("newsarticle-changes")
+            while url:
+                response = api_client.get(url, params)
+                assert response.status_code == status.HTTP_200_OK
+                for change in response.data["results"]:
+                    changes[change["id"]] = change.get("article", {}).get("title") or change["reason"]
+                url, params, since = response.data["next"], {}, response.data["since"]
+            return changes, since
+
+        def login():
+            token = self._get_token(api_client, client_user.email, "client_password")
+            api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        open_article = create_article("Open", "")
+        taxes_article = create_article("Taxes", "TAX")
+        login()
+        changes, since = sync()
+        assert changes == {published_article.pk: "Test Article", open_article.pk: "Open"}
+        assert sync(since)[0] == {}
+
+        # Only what the client reads, once per article
+        published_article.title = "Updated"
+        published_article.save()
+        published_article.save()
+        open_article.status = "DRAF"
+        open_article.save()
+        new_article = create_article("New", "POW")
+        draft_article.status = "PUBD"
+        draft_article.save()
+        taxes_article.title = "Taxes updated"
+        taxes_article.save()
+        changes, since = sync(since)
+        assert changes == {published_article.pk: "Updated", open_article.pk: "unpublished", new_article.pk: "New"}
+
+        # A change committed after later ones isn't skipped
+        updated, release = threading.Event(), threading.Event()
+
+        def update_later():
+            with transaction.atomic():
+                NewsArticle.objects.filter(pk=new_article.pk).update(title="Committed late")
+                updated.set()
+                release.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=update_later)
+        thread.start()
+        updated.wait(5)
+        published_article.title = "Updated again"
+        published_article.save()
+        changes, since = sync(since)
+        assert changes == {}
+        release.set()
+        thread.join()
+        changes, since = sync(since)
+        assert changes == {new_article.pk: "Committed late", published_article.pk: "Updated again"}
+
+        # The client loses POW and gains TAX: the articles of both are sent, moved and deleted ones too
+        client_user.accessible_columns = ["TAX"]
+        client_user.save()
+        login()
+        new_article.column = "EN"
+        new_article.save()
+        deleted_pk = published_article.pk
+        published_article.delete()
+        changes, since = sync(since)
+        assert changes == {
+            new_article.pk: "not_entitled",
+            deleted_pk: "deleted",
+            draft_article.pk: "Draft Article",
+            taxes_article.pk: "Taxes updated",
+        }
+        assert sync(since)[0] == {}
+
+        # Trimming the log expires the tokens from before its new start, not the others
+        old_since = since
+        taxes_article.title = "Taxes trimmed"
+        taxes_article.save()
+        changes, since = sync(since)
+        assert changes == {taxes_article.pk: "Taxes trimmed"}
+        expired_at = datetime.now(timezone.utc) - timedelta(hours=settings.ARTICLE_EVENT_RETENTION_HOURS, minutes=1)
+        ArticleEvent.objects.update(created_at=expired_at)
+        count = ArticleEvent.objects.count()
+        # The newest expired event is kept, where the log starts
+        assert trim_article_events() == count - 1
+        assert trim_article_events() == 0
+        assert sync(since)[0] == {}
+        response = api_client.get(reverse("newsarticle-changes"), {"since": old_since})
+        assert response.status_code == status.HTTP_410_GONE
+
+        response = api_client.get(reverse("newsarticle-changes"), {"since": "invalid"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        settings.ARTICLE_EVENT_RETENTION_HOURS = 0
+        response = api_client.get(reverse("newsarticle-changes"), {"since": since})
+        assert response.status_code == status.HTTP_410_GONE
+
+    def test_views_are_counted_in_batches_and_ranked_by_recency(
+        self, api_client, settings, client_user, published_article
+    ):
+        settings.VIEW_COUNTER_FLUSH_SECONDS = 3600
+        view_counter.flush()
+        articles = [published_article]
+        for title, column in (("Recent", "POW"), ("Open", ""), ("Taxes", "TAX")):
+            articles.append(
+                NewsArticle.objects.create(
+                    title=title,
+                    subtitle=title,
+                    draft_content=title,
+                    published_content=title,
+                    original_publication_at="2024-02-24T12:00:00Z",
+                    last_publication_update_at="2024-02-24T12:00:00Z",
+                    status="PUBD",
+                    column=column,
+                )
+            )
+        old, recent, open_article, taxes = articles
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        # Reads don't write the counts
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(10):
+                api_client.get(reverse("newsarticle-detail", args=[old.pk]))
+        assert not any("articleviewcount" in query["sql"] for query in queries.captured_queries)
+
+        # 10 views two days ago weigh less than 3 now, with a 24 hours half-life
+        now = datetime.now(timezone.utc)
+        with CaptureQueriesContext(connection) as queries:
+            assert view_counter.flush(now=now - timedelta(days=2)) == 1
+        assert len([query for query in queries.captured_queries if "articleviewcount" in query["sql"]]) == 1
+        for article, views in ((recent, 3), (open_article, 1), (taxes, 5)):
+            for _ in range(views):
+                view_counter.record(article.pk)
+        settings.VIEW_COUNTER_MAX_PENDING = 3
+        api_client.get(reverse("newsarticle-detail", args=[recent.pk]))  # Flushes, the counter is full
+        assert ArticleViewCount.objects.get(article=old).views == 10
+        assert ArticleViewCount.objects.get(article=recent).views == 4
+
+        def trending(**params):
+            response = api_client.get(reverse("newsarticle-trending"), params)
+            assert response.status_code == status.HTTP_200_OK
+            return [article["id"] for article in response.data["results"]]
+
+        # Only the articles the client reads, of one column
+        assert trending(column="POW") == [recent.pk, old.pk]
+        assert trending(column="") == [open_article.pk]
+        assert trending(column="TAX") == []
+        for params in ({}, {"column": "NOPE"}):
+            response = api_client.get(reverse("newsarticle-trending"), params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        # Moved articles rank in their new column from the next flush
+        recent.column = "HLTH"
+        recent.save()
+        assert trending(column="POW") == [old.pk]
+        client_user.accessible_columns = ["HLTH", "POW"]
+        client_user.save()
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        view_counter.record(recent.pk)
+        view_counter.flush()
+        assert trending(column="HLTH") == [recent.pk]
+
+    def test_view_counter_flushes_without_further_views(self, settings, monkeypatch):
+        settings.VIEW_COUNTER_FLUSH_SECONDS = 0.1
+        counter = ViewCounter()
+        flushed = threading.Event()
+
+        def flush():
+            counter._pending.clear()
+            flushed.set()
+
+        monkeypatch.setattr(counter, "flush", flush)
+        counter.record(1)
+        assert flushed.wait(timeout=5)
+
+    def test_seed_news_command(self):
+        out = StringIO()
+        call_command("seed_news", users=200, articles=500, chunk_size=150, seed=1, stdout=out)
+        assert "Seeded 200 users and 500 articles" in out.getvalue()
+
+        users = User.objects.filter(email__startswith="seed")
+        assert users.count() == 200
+        assert users.filter(user_profile=USER_PROFILES[1][0]).count() > users.filter(user_profile="EMP").count()
+        assert users.filter(plan="PRO", accessible_columns__len__gt=0).exists()
+        assert users.first().check_password("seed_password")
+
+        articles = NewsArticle.objects.all()
+        assert articles.count() == 500
+        assert articles.filter(status="PUBD").count() > articles.filter(status="DRAF").count()
+        assert set(articles.values_list("column", flat=True)) <= {""} | {column for column, _ in ARTICLE_COLUMNS}
+        assert not articles.filter(search_vector=None).exists()
+        assert not articles.exclude(author__user_profile="EMP").exists()
+
+    def test_seed_news_needs_words_for_every_column(self, monkeypatch):
+        monkeypatch.setitem(seed_news.COLUMN_WEIGHTS, "NEW", 1)
+        with pytest.raises(CommandError, match="NEW"):
+            call_command("seed_news", users=1, articles=1, stdout=StringIO())
+        assert not User.objects.filter(email__startswith="seed").exists()
+
     def _get_token(self, api_client, email, password):
         url = reverse("token_obtain_pair")
         response = api_client.post(url, {"email": email, "password": password}, format="json")
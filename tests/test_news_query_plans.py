@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from django.db import connection
+from django.contrib.auth import get_user_model
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from news_api.models import NewsArticle
+from news_api.pagination import NewsArticleCursorPagination
+from news_api.views import NewsArticleViewSet
+from utils.global_values import USER_PROFILES, ARTICLE_COLUMNS, PLANS, ARTICLE_STATUS
+
+User = get_user_model()  # Get the user model dynamically
+
+SEED_ARTICLES = 20000
+
+
+@pytest.fixture
+def admin_user():
+    return User.objects.create_user(
+        email="admin@test.com",
+        password="admin_password",
+        name="Admin User",
+        user_profile=USER_PROFILES[0][0],
+        is_admin=True,
+        employee_id="EMP001",
+    )
+
+
+@pytest.fixture
+def employee_user():
+    return User.objects.create_user(
+        email="employee@test.com",
+        password="employee_password",
+        name="Employee User",
+        user_profile=USER_PROFILES[0][0],
+        employee_id="EMP002",
+    )
+
+
+@pytest.fixture
+def client_user():
+    return User.objects.create_user(
+        email="client@test.com",
+        password="client_password",
+        name="Client User",
+        user_profile=USER_PROFILES[1][0],
+        plan=PLANS[1][0],
+        accessible_columns=[ARTICLE_COLUMNS[0][0]],  # POW
+    )
+
+
+@pytest.fixture
+def seeded_articles(admin_user, employee_user):
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    columns = [""] + [column for column, _ in ARTICLE_COLUMNS]
+    articles = []
+    for i in range(SEED_ARTICLES):
+        published_at = start + timedelta(minutes=i)
+        articles.append(
+            NewsArticle(
+                title=f"Article {i}",
+                subtitle="Seeded subtitle",
+                draft_content="Seeded content",
+                published_content="Seeded content",
+                original_publication_at=published_at,
+                last_publication_update_at=published_at,
+                # Employees only write a small share of the catalog each
+                author=employee_user if rng.random() < 0.01 else admin_user,
+                status=ARTICLE_STATUS[1][0] if rng.random() < 0.8 else ARTICLE_STATUS[0][0],
+                column=rng.choice(columns),
+            )
+        )
+    NewsArticle.objects.bulk_create(articles, batch_size=2000)
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {NewsArticle._meta.db_table}")
+
+
+def _first_page_plan(user):
+    request = Request(APIRequestFactory().get("/news/"))
+    request.user = user
+    view = NewsArticleViewSet(request=request, action="list", format_kwarg=None)
+    queryset = view.get_queryset().order_by(*NewsArticleCursorPagination.ordering)
+    return queryset[: NewsArticleCursorPagination.page_size + 1].explain()
+
+
+@pytest.mark.django_db
+class TestNewsQueryPlans:
+    """
+    Guard the feed queries against silently falling back to sequential scans.
+    """
+
+    def test_admin_feed_uses_index(self, admin_user, seeded_articles):
+        plan = _first_page_plan(admin_user)
+        assert "Seq Scan" not in plan, plan
+        assert "news_feed_idx" in plan, plan
+
+    def test_employee_feed_uses_index(self, employee_user, seeded_articles):
+        plan = _first_page_plan(employee_user)
+        assert "Seq Scan" not in plan, plan
+
+    def test_client_feed_uses_index(self, client_user, seeded_articles):
+        plan = _first_page_plan(client_user)
+        assert "Seq Scan" not in plan, plan
+        assert "news_published" in plan, plan
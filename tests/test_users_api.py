@@ -1,8 +1,21 @@
+import csv
+import io
+import json
+
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import AsyncClient
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from users_api.auth import get_token_version_cache_key
 from users_api.models import User
+from users_api.serializers import UserSerializer
+from users_api.views import UserCollectionView
 from utils.global_values import USER_PROFILES, ARTICLE_COLUMNS
 
 
@@ -102,6 +115,209 @@ class TestUserAPI:
         response = api_client.post(url, data, format="json")
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
+    def test_admin_can_list_users_with_sparse_fieldset(self, api_client, admin_user, client_user):
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        response = api_client.get(reverse("user_management"), {"fields": "id,email"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == [
+            {"id": admin_user.id, "email": admin_user.email},
+            {"id": client_user.id, "email": client_user.email},
+        ]
+
+    def test_requests_are_authenticated_from_token_claims(self, api_client, client_user):
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("newsarticle-list")
+        api_client.get(url)  # Caches the token version
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert not [q for q in queries.captured_queries if 'FROM "users_api_user"' in q["sql"]]
+
+    def test_access_change_revokes_tokens(self, api_client, admin_user, client_user):
+        response = api_client.post(
+            reverse("token_obtain_pair"), {"email": client_user.email, "password": "client_password"}, format="json"
+        )
+        client_tokens = response.data
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {client_tokens['access']}")
+        assert api_client.get(reverse("newsarticle-list")).status_code == status.HTTP_200_OK
+
+        # Editing something unrelated to access keeps the tokens valid
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("user_management", kwargs={"user_id": client_user.id})
+        response = api_client.put(url, {"name": "Renamed Client"}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {client_tokens['access']}")
+        assert api_client.get(reverse("newsarticle-list")).status_code == status.HTTP_200_OK
+
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.put(url, {"accessible_columns": [ARTICLE_COLUMNS[1][0]]}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        # The new version is cached, rather than read again from a replica that may not have it yet
+        client_user.refresh_from_db()
+        assert cache.get(get_token_version_cache_key(client_user.pk)) == client_user.token_version
+
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {client_tokens['access']}")
+        assert api_client.get(reverse("newsarticle-list")).status_code == status.HTTP_401_UNAUTHORIZED
+        api_client.credentials()
+        response = api_client.post(reverse("token_refresh"), {"refresh": client_tokens["refresh"]}, format="json")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # Logging in again gives tokens with the new columns
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert api_client.get(reverse("newsarticle-list")).status_code == status.HTTP_200_OK
+
+    def test_admin_user_listing_filters_and_pages(self, api_client, admin_user, employee_user, client_user):
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("user_management")
+
+        response = api_client.get(url, {"user_profile": USER_PROFILES[0][0], "page_size": 1, "fields": "id"})
+        assert response.data["results"] == [{"id": admin_user.id}]
+        response = api_client.get(response.data["next"])
+        assert response.data["results"] == [{"id": employee_user.id}]
+        assert response.data["next"] is None
+
+        response = api_client.get(url, {"column": ARTICLE_COLUMNS[0][0], "fields": "id"})
+        assert response.data["results"] == [{"id": client_user.id}]
+        response = api_client.get(url, {"is_active": "false"})
+        assert response.data["results"] == []
+
+    def test_admin_can_export_users(self, api_client, admin_user, client_user):
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        url = reverse("user_management")
+
+        response = api_client.get(url, {"export": "ndjson", "fields": "id,email,accessible_columns"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"id": admin_user.id, "email": admin_user.email, "accessible_columns": None},
+            {"id": client_user.id, "email": client_user.email, "accessible_columns": [ARTICLE_COLUMNS[0][0]]},
+        ]
+
+        response = api_client.get(url, {"export": "csv", "fields": "id,email", "user_profile": USER_PROFILES[1][0]})
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        assert rows == [["id", "email"], [str(client_user.id), client_user.email]]
+
+        response = api_client.get(url, {"export": "xml"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db(transaction=True)
+    def test_export_is_streamed_under_asgi(self, api_client, admin_user, employee_user, client_user, monkeypatch):
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        monkeypatch.setattr(UserCollectionView, "export_chunk_size", 1)
+        serialized = []
+        to_representation = UserSerializer.to_representation
+
+        def record(serializer, user):
+            serialized.append(user.pk)
+            return to_representation(serializer, user)
+
+        monkeypatch.setattr(UserSerializer, "to_representation", record)
+
+        async def export():
+            response = await AsyncClient().get(
+                reverse("user_management"),
+                {"export": "ndjson", "fields": "id"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            assert response.is_async
+            stream = aiter(response.streaming_content)
+            first = await anext(stream)
+            # Sent before the other users are read
+            assert serialized == [admin_user.id]
+            return [first] + [chunk async for chunk in stream]
+
+        lines = async_to_sync(export)()
+        assert [json.loads(line)["id"] for line in lines] == [admin_user.id, employee_user.id, client_user.id]
+
+    def test_admin_can_provision_users_in_bulk(self, api_client, admin_user, client_user):
+        url = reverse("user_bulk_provision")
+        rows = [
+            {"email": "a@corp.com", "password": "a_password", "name": "A", "user_profile": USER_PROFILES[1][0]},
+            {"email": client_user.email, "password": "password", "name": "Taken", "user_profile": "CLI"},
+            {"email": "b@CORP.com", "name": "B", "user_profile": USER_PROFILES[1][0], "accessible_columns": ["POW"]},
+            {"email": "b@corp.com", "password": "password", "name": "Duplicated", "user_profile": "CLI"},
+            {"email": "c@corp.com", "password": "password", "name": "C", "user_profile": "XXX"},
+        ]
+
+        token = self._get_token(api_client, client_user.email, "client_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        assert api_client.post(url, rows, format="json").status_code == status.HTTP_403_FORBIDDEN
+
+        token = self._get_token(api_client, admin_user.email, "admin_password")
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = api_client.post(url, rows, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 2
+        assert response.data["failed"] == 3
+        results = response.data["results"]
+        assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+        assert [result.get("email") for result in results] == ["a@corp.com", None, "b@corp.com", None, None]
+        assert set(results[1]["errors"]) == {"email"}
+        assert set(results[3]["errors"]) == {"email"}
+        assert set(results[4]["errors"]) == {"user_profile"}
+
+        user = User.objects.get(id=results[0]["id"])
+        assert user.check_password("a_password")
+        user = User.objects.get(id=results[2]["id"])
+        assert not user.has_usable_password()
+        assert user.accessible_columns == ["POW"]
+
+        response = api_client.post(url, {"email": "d@corp.com"}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_provision_users_skips_emails_taken_during_the_batch(self, monkeypatch):
+        from users_api import provisioning
+
+        hash_passwords = provisioning.hash_passwords
+
+        def hash_passwords_and_race(passwords):
+            # Another request creates one of the emails after they were checked
+            User.objects.create_user(email="b@corp.com", password="password", name="Other")
+            return hash_passwords(passwords)
+
+        monkeypatch.setattr(provisioning, "hash_passwords", hash_passwords_and_race)
+        rows = [
+            {"email": f"{name}@corp.com", "password": "password", "name": name, "user_profile": "CLI"} for name in "abc"
+        ]
+        report = provisioning.provision_users(rows)
+
+        assert report["created"] == 2
+        assert report["failed"] == 1
+        results = report["results"]
+        assert [result["index"] for result in results] == [0, 1, 2]
+        assert set(results[1]["errors"]) == {"email"}
+        assert User.objects.get(email="b@corp.com").name == "Other"
+        assert User.objects.filter(id__in=[results[0]["id"], results[2]["id"]]).count() == 2
+
+    def test_provision_users_command(self, tmp_path):
+        path = tmp_path / "users.ndjson"
+        path.write_text(
+            "\n".join(
+                json.dumps({"email": f"user{i}@corp.com", "password": f"password{i}", "name": f"User {i}"})
+                for i in range(3)
+            )
+            + "\n"
+        )
+        out, err = io.StringIO(), io.StringIO()
+        call_command("provision_users", str(path), "--batch-size", "2", stdout=out, stderr=err)
+        # user_profile is required
+        assert "Created 0 users, skipped 3" in out.getvalue()
+        assert err.getvalue().count("user_profile") == 3
+
+        path.write_text(path.read_text().replace('"name"', '"user_profile": "CLI", "name"'))
+        call_command("provision_users", str(path), "--batch-size", "2", stdout=out, stderr=err)
+        assert "Created 3 users" in out.getvalue()
+        assert User.objects.get(email="user2@corp.com").check_password("password2")
+
     def _get_token(self, api_client, email, password):
         url = reverse("token_obtain_pair")
         response = api_client.post(url, {"email": email, "password": password}, format="json")
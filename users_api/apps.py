@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class UsersApiConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "users_api"
+
+    def ready(self):
+        from . import signals  # noqa: F401
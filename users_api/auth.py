@@ -1,5 +1,15 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from utils.global_values import USER_PROFILES
 
 
 class EmailBackend(ModelBackend):
@@ -13,3 +23,126 @@ class EmailBackend(ModelBackend):
             if user.check_password(password):
                 return user
         return None
+
+
+# -------- Stateless JWT authentication -------- #
+# User fields copied into the tokens, so requests can be authorized without loading the user
+USER_CLAIMS = ("user_profile", "is_admin", "accessible_columns", "token_version")
+# Changing any of these fields revokes the user's tokens (see users_api/signals.py)
+TOKEN_REVOKING_FIELDS = ("user_profile", "is_admin", "accessible_columns", "is_active", "password")
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def get_token_version_cache_key(user_id):
+    return f"users_api:token_version:{user_id}"
+
+
+def get_token_version_queryset(user_id):
+    User = get_user_model()
+    return User.objects.using(router.db_for_write(User)).filter(pk=user_id, is_active=True).values("token_version")
+
+
+def get_token_version(user_id):
+    """
+    Return the current token version of an active user, None if there's no such user.
+
+    Read from the cache, falling back to the primary database: a replica may not have
+    replayed a revocation yet. With a per-process cache (the local memory default) other
+    workers see a version change after TOKEN_VERSION_CACHE_TIMEOUT seconds at most, a shared
+    cache sees it immediately.
+    """
+    key = get_token_version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        user = get_token_version_queryset(user_id).first()
+        version = user["token_version"] if user else -1
+        cache.set(key, version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version if version >= 0 else None
+
+
+async def aget_token_version(user_id):
+    """
+    Async version of get_token_version.
+    """
+    key = get_token_version_cache_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        user = await get_token_version_queryset(user_id).afirst()
+        version = user["token_version"] if user else -1
+        await cache.aset(key, version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version if version >= 0 else None
+
+
+def check_token_version(token):
+    """
+    Raise AuthenticationFailed if the token was issued before the user's current token version.
+    """
+    if token.get("token_version") != get_token_version(token[api_settings.USER_ID_CLAIM]):
+        raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
+async def acheck_token_version(token):
+    """
+    Async version of check_token_version.
+    """
+    if token.get("token_version") != await aget_token_version(token[api_settings.USER_ID_CLAIM]):
+        raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
+class ClaimsUser(TokenUser):
+    """
+    User backed by the claims of its access token (see add_user_claims), no database row loaded.
+    """
+
+    @property
+    def is_employee(self):
+        return self.user_profile == USER_PROFILES[0][0]  # Assuming first profile is employee
+
+    @property
+    def is_client(self):
+        return self.user_profile == USER_PROFILES[1][0]  # Assuming second profile is client
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from the token claims instead of loading it.
+
+    The only lookup left is the user's token version, which is cached. Tokens issued before the
+    claims were added are still authenticated the usual way, from the database.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        if "token_version" not in validated_token:
+            return super().get_user(validated_token)
+
+        check_token_version(validated_token)
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        Async version of authenticate, for async views (see utils/async_views.py).
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        if "token_version" not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        await acheck_token_version(validated_token)
+        return api_settings.TOKEN_USER_CLASS(validated_token)
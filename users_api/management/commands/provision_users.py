@@ -0,0 +1,60 @@
+import json
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users_api.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users in bulk from a JSON list or an NDJSON file (one user per line). "
+        "Passwords are hashed by PASSWORD_HASHING_WORKERS processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File with the users, "-" for stdin')
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--report", help="Write the full JSON report (one result per row) to this file")
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options["path"])
+        report = provision_users(rows, batch_size=options["batch_size"])
+
+        for result in report["results"]:
+            if "errors" in result:
+                self.stderr.write(f"Row {result['index']}: {json.dumps(result['errors'])}")
+        if options["report"]:
+            with open(options["report"], "w") as report_file:
+                json.dump(report, report_file)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']} users, skipped {report['failed']} "
+                f"in {report['elapsed_seconds']}s ({report['rows_per_second']} rows/s, "
+                f"{settings.PASSWORD_HASHING_WORKERS} hashing workers)"
+            )
+        )
+
+    def read_rows(self, path):
+        if path == "-":
+            content = sys.stdin.read()
+        else:
+            with open(path) as source:
+                content = source.read()
+
+        if content.lstrip().startswith("["):
+            try:
+                return json.loads(content)
+            except ValueError as e:
+                raise CommandError(f"Invalid JSON: {e}")
+        rows = []
+        for line_number, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                raise CommandError(f"Invalid JSON on line {line_number}: {e}")
+        return rows
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users_api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_picture_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.19 on 2026-10-18 19:38
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users_api", "0003_user_token_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["accessible_columns"], name="user_accessible_columns_idx"
+            ),
+        ),
+    ]
@@ -2,6 +2,7 @@ from typing import Tuple
 
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 
 from utils.functions import validate_image_file
@@ -38,6 +39,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=200)
     user_profile = models.CharField(max_length=4, choices=USER_PROFILES)
     profile_picture = models.ImageField(upload_to="profile_pictures/", validators=[validate_image_file], blank=True)
+    # Resized/WebP copies of profile_picture
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_admin = models.BooleanField(default=False)
@@ -46,6 +49,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     accessible_columns = ArrayField(models.CharField(max_length=4, choices=ARTICLE_COLUMNS), blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    token_version = models.PositiveIntegerField(default=0, editable=False)  # Bumped to revoke the user's tokens
 
     groups = models.ManyToManyField(
         "auth.Group",
@@ -85,3 +89,7 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     class Meta:
         app_label = "users_api"
+        indexes = [
+            # Admin user listing filtered by column (accessible_columns @> [column])
+            GinIndex(fields=["accessible_columns"], name="user_accessible_columns_idx"),
+        ]
@@ -0,0 +1,108 @@
+import math
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import User
+from .serializers import ProvisionUserSerializer
+from utils.processes import create_process_pool
+
+_executor = None
+
+
+def get_executor():
+    """
+    Return the process pool hashing the passwords, started on first use.
+    """
+    global _executor
+    if _executor is None:
+        _executor = create_process_pool(settings.PASSWORD_HASHING_WORKERS)
+    return _executor
+
+
+def hash_passwords(passwords):
+    """
+    Return make_password() of each password (None gives an unusable password), hashed across the pool.
+    """
+    workers = settings.PASSWORD_HASHING_WORKERS
+    if workers <= 1 or len(passwords) <= 1:
+        return [make_password(password) for password in passwords]
+    # A few chunks per worker keeps them all busy without paying the IPC cost of every single password
+    chunksize = math.ceil(len(passwords) / (workers * 4))
+    return list(get_executor().map(make_password, passwords, chunksize=chunksize))
+
+
+def skip_taken_emails(valid, results):
+    """
+    Return the (index, data) of `valid` whose email isn't taken, add an error to `results` for the others.
+    """
+    taken = set(User.objects.filter(email__in=[data["email"] for _, data in valid]).values_list("email", flat=True))
+    for index, data in valid:
+        if data["email"] in taken:
+            results.append({"index": index, "errors": {"email": ["user with this email already exists."]}})
+    return [(index, data) for index, data in valid if data["email"] not in taken]
+
+
+def provision_users(rows, batch_size=500):
+    """
+    Create users from `rows` (ProvisionUserSerializer payloads), `batch_size` at a time.
+
+    Each batch is validated, its passwords are hashed in parallel (PBKDF2 dominates the cost
+    of creating a user) and its users are inserted with a single bulk_create, all in one
+    transaction. Invalid rows and emails that are already taken are skipped, including those
+    another request creates while the batch is processed. Returns a report
+    with one result per row, in order: the new user's id, or the row's errors.
+    """
+    started = time.perf_counter()
+    serializer = ProvisionUserSerializer()
+    seen_emails = set()
+    report = {"created": 0, "failed": 0, "results": []}
+    rows = enumerate(rows)
+
+    with transaction.atomic():
+        while batch := list(islice(rows, batch_size)):
+            results, valid = [], []
+            for index, row in batch:
+                try:
+                    if not isinstance(row, dict):
+                        raise ValidationError({"non_field_errors": ["Expected a JSON object"]})
+                    validated_data = serializer.run_validation(row)
+                except ValidationError as e:
+                    results.append({"index": index, "errors": e.detail})
+                    continue
+                validated_data["email"] = User.objects.normalize_email(validated_data["email"])
+                if validated_data["email"] in seen_emails:
+                    results.append({"index": index, "errors": {"email": ["Duplicated in this request."]}})
+                    continue
+                seen_emails.add(validated_data["email"])
+                valid.append((index, validated_data))
+
+            valid = skip_taken_emails(valid, results)
+            passwords = hash_passwords([data.pop("password", None) for _, data in valid])
+            valid = [(index, {**data, "password": password}) for (index, data), password in zip(valid, passwords)]
+            while True:
+                try:
+                    # A savepoint, so a conflicting insert doesn't abort the whole request
+                    with transaction.atomic():
+                        users = User.objects.bulk_create([User(**data) for _, data in valid])
+                    break
+                except IntegrityError:
+                    # Another request created some of the emails since they were checked
+                    remaining = skip_taken_emails(valid, results)
+                    if len(remaining) == len(valid):
+                        raise
+                    valid = remaining
+            for (index, _), user in zip(valid, users):
+                results.append({"index": index, "id": user.pk, "email": user.email})
+            report["results"].extend(sorted(results, key=lambda result: result["index"]))
+
+    report["created"] = sum("id" in result for result in report["results"])
+    report["failed"] = len(report["results"]) - report["created"]
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(len(report["results"]) / elapsed, 1) if elapsed else None
+    return report
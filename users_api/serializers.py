@@ -1,12 +1,15 @@
 from rest_framework import serializers
 from .models import User
+from utils.serializers import ImageVariantsField, SparseFieldsetMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for User model.
     """
 
+    profile_picture_variants = ImageVariantsField("profile_picture", "profile_picture_variants")
+
     class Meta:
         model = User
         fields = [
@@ -15,6 +18,7 @@ class UserSerializer(serializers.ModelSerializer):
             "name",
             "user_profile",
             "profile_picture",
+            "profile_picture_variants",
             "is_active",
             "is_admin",
             "employee_id",
@@ -33,3 +37,28 @@ class UserSerializer(serializers.ModelSerializer):
             user.set_password(password)
             user.save()
         return user
+
+
+class ProvisionUserSerializer(UserSerializer):
+    """
+    Serializer for the rows of a bulk user provisioning (see users_api/provisioning.py).
+
+    Email uniqueness is checked once per batch by the provisioning, instead of one query per row.
+    """
+
+    class Meta(UserSerializer.Meta):
+        fields = [
+            "email",
+            "password",
+            "name",
+            "user_profile",
+            "is_active",
+            "is_admin",
+            "employee_id",
+            "plan",
+            "accessible_columns",
+        ]
+        extra_kwargs = {
+            "password": {"write_only": True, "required": False},
+            "email": {"validators": []},
+        }
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from utils.images import schedule_image_variants
+from .auth import TOKEN_REVOKING_FIELDS, get_token_version_cache_key
+from .models import User
+
+
+@receiver(pre_save, sender=User)
+def detect_token_revoking_change(sender, instance, update_fields=None, **kwargs):
+    instance._revoke_tokens = False
+    if instance._state.adding or (update_fields is not None and not set(update_fields) & set(TOKEN_REVOKING_FIELDS)):
+        return
+    saved = User.objects.filter(pk=instance.pk).values(*TOKEN_REVOKING_FIELDS).first()
+    instance._revoke_tokens = saved is not None and any(
+        saved[field] != getattr(instance, field) for field in TOKEN_REVOKING_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_save(sender, instance, **kwargs):
+    if getattr(instance, "_revoke_tokens", False):
+        User.objects.filter(pk=instance.pk).update(token_version=F("token_version") + 1)
+        instance.refresh_from_db(fields=["token_version"])
+        # Cached rather than deleted, the next lookup could read the old version from a lagging replica
+        version = instance.token_version if instance.is_active else -1  # As get_token_version returns it
+        cache.set(get_token_version_cache_key(instance.pk), version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    # -1 for a user that doesn't exist (see get_token_version)
+    cache.set(get_token_version_cache_key(instance.pk), -1, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+
+
+@receiver(post_save, sender=User)
+def generate_profile_picture_variants_on_save(sender, instance, **kwargs):
+    schedule_image_variants(instance, "profile_picture", "profile_picture_variants")
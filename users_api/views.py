@@ -1,15 +1,28 @@
 # from django.shortcuts import render
+import csv
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework import status, permissions, generics  # , viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.permissions import BasePermission
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
+from .auth import add_user_claims, check_token_version
 from .models import User
-from .serializers import UserSerializer
+from .pagination import UserCursorPagination
+from .provisioning import provision_users
+from .serializers import ProvisionUserSerializer, UserSerializer
+from utils.functions import get_query_param_list
 from utils.global_values import USER_PROFILES
 
 # Create your views here.
@@ -74,26 +87,126 @@ class ClientUserCreateView(generics.CreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
+class Echo:
+    """
+    File-like object that returns what is written to it, for streaming csv.writer rows.
+    """
+
+    def write(self, value):
+        return value
+
+
 class UserCollectionView(APIView):
     """
     View for managing the collection of users.
 
     get:
-    Return a list of all users (admin only).
+    Return a page of users (admin only), by id. Accepts filters (?user_profile=, ?plan=,
+    ?column=, ?is_active=), ?fields=id,email,... to return only some fields, and
+    ?export=ndjson or ?export=csv to stream every matching user instead of a page.
 
     post:
     Create a new user (admin only).
     """
 
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    pagination_class = UserCursorPagination
+    export_chunk_size = 2000
+    export_formats = ("ndjson", "csv")
 
     @swagger_auto_schema(
-        operation_description="List all users (admin only)", responses={200: UserSerializer(many=True)}
+        operation_description="List users (admin only)",
+        manual_parameters=[
+            openapi.Parameter("user_profile", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter("plan", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter(
+                "column", openapi.IN_QUERY, description="Users with access to the column", type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter("is_active", openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter(
+                "fields", openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                "export",
+                openapi.IN_QUERY,
+                description="Stream every matching user instead of a page",
+                type=openapi.TYPE_STRING,
+                enum=list(export_formats),
+            ),
+        ],
+        responses={200: UserSerializer(many=True)},
     )
     def get(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        fields = get_query_param_list(request, "fields")
+        serializer = UserSerializer(fields=fields, context={"request": request})
+        users = self.filter_queryset(request, User.objects.only(*serializer.get_only_fields()))
+
+        export = request.query_params.get("export")
+        if export is not None:
+            if export not in self.export_formats:
+                raise ValidationError({"export": f"Must be one of: {', '.join(self.export_formats)}"})
+            return self.export(users.order_by("id"), serializer, export)
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(users, request, view=self)
+        serializer = UserSerializer(page, many=True, fields=fields, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
+
+    def filter_queryset(self, request, queryset):
+        params = request.query_params
+        if "user_profile" in params:
+            queryset = queryset.filter(user_profile=params["user_profile"])
+        if "plan" in params:
+            queryset = queryset.filter(plan=params["plan"])
+        if "column" in params:
+            queryset = queryset.filter(accessible_columns__contains=[params["column"]])
+        if "is_active" in params:
+            queryset = queryset.filter(is_active=params["is_active"].lower() in ("true", "1"))
+        return queryset
+
+    def export(self, users, serializer, export_format):
+        """
+        Stream the users as they are read from a server-side cursor, so memory use doesn't grow with the table.
+
+        Under ASGI the content is an async iterator: Django reads a sync one to the end before sending it.
+        """
+        if export_format == "csv":
+            writer = csv.writer(Echo())
+            header, content_type = writer.writerow(list(serializer.fields)), "text/csv"
+
+            def format_row(row):
+                return writer.writerow(
+                    [
+                        json.dumps(value, cls=JSONEncoder) if isinstance(value, (list, dict)) else value
+                        for value in row.values()
+                    ]
+                )
+
+        else:
+            header, content_type = None, "application/x-ndjson"
+
+            def format_row(row):
+                return json.dumps(row, cls=JSONEncoder) + "\n"
+
+        if isinstance(self.request._request, ASGIRequest):
+            content = self._alines(users, serializer, header, format_row)
+        else:
+            content = self._lines(users, serializer, header, format_row)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response.headers["Content-Disposition"] = f'attachment; filename="users.{export_format}"'
+        return response
+
+    def _lines(self, users, serializer, header, format_row):
+        if header is not None:
+            yield header
+        for user in users.iterator(chunk_size=self.export_chunk_size):
+            yield format_row(serializer.to_representation(user))
+
+    async def _alines(self, users, serializer, header, format_row):
+        if header is not None:
+            yield header
+        async for user in users.aiterator(chunk_size=self.export_chunk_size):
+            yield format_row(serializer.to_representation(user))
 
     @swagger_auto_schema(
         operation_description="Create a new user (admin only)",
@@ -108,6 +221,31 @@ class UserCollectionView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class UserBulkProvisionView(APIView):
+    """
+    View for creating many users at once (admin only), e.g. when onboarding a corporate plan.
+
+    post:
+    Create the users of a JSON list. Every valid row is created, the response has one result
+    per row: the new user's id, or why the row was skipped.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    max_rows = 10000
+
+    @swagger_auto_schema(
+        operation_description="Create many users at once (admin only)",
+        request_body=ProvisionUserSerializer(many=True),
+    )
+    def post(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({"non_field_errors": ["Expected a list of users."]})
+        if len(request.data) > self.max_rows:
+            raise ValidationError({"non_field_errors": [f"At most {self.max_rows} users per request."]})
+        report = provision_users(request.data)
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class UserManagementView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsSelfOrAdmin]
 
@@ -157,6 +295,24 @@ class UserManagementView(APIView):
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = "email"
 
+    @classmethod
+    def get_token(cls, user):
+        # The access token inherits the claims of the refresh token
+        return add_user_claims(super().get_token(user), user)
+
 
 class EmailTokenObtainPairView(TokenObtainPairView):
     serializer_class = EmailTokenObtainPairSerializer
+
+
+class EmailTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        # Refresh tokens issued before the user's last access change can't be used anymore
+        if "token_version" in refresh:
+            check_token_version(refresh)
+        return super().validate(attrs)
+
+
+class EmailTokenRefreshView(TokenRefreshView):
+    serializer_class = EmailTokenRefreshSerializer
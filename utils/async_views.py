@@ -0,0 +1,163 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.urls import URLPattern
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+SAFE_ACTION_METHODS = ("get", "head")
+
+
+def as_async_view(view):
+    """
+    Return an async version of the DRF viewset view `view` (from `ViewSet.as_view`).
+
+    GET and HEAD requests of the actions the viewset also implements as coroutines (`alist` for
+    `list`) are served on the event loop: the request is authenticated with the authenticators'
+    `aauthenticate`, then goes through the usual permission checks, exception handling and
+    rendering of the viewset. Other requests are served by `view` in a thread, as Django would.
+    """
+    viewset_class, actions = view.cls, view.actions
+    if "get" in actions and "head" not in actions:
+        actions["head"] = actions["get"]  # As in ViewSetMixin.as_view
+
+    async def async_view(request, *args, **kwargs):
+        action = actions.get("get")
+        handler = getattr(viewset_class, f"a{action}", None) if action else None
+        if request.method.lower() not in SAFE_ACTION_METHODS or handler is None:
+            return await sync_to_async(view)(request, *args, **kwargs)
+
+        self = viewset_class(**view.initkwargs)
+        self.action_map = actions
+        for method, action_name in actions.items():
+            setattr(self, method, getattr(self, action_name))  # As in ViewSetMixin.as_view, for the Allow header
+        self.args = args
+        self.kwargs = kwargs
+        self.request = request = self.initialize_request(request, *args, **kwargs)
+        self.headers = self.default_response_headers
+        try:
+            await aauthenticate(request)
+            self.initial(request, *args, **kwargs)
+            response = await handler(self, request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return render(self.finalize_response(request, response, *args, **kwargs))
+
+    # Same attributes as the DRF view, so the schema, /metrics and profiling see the viewset
+    async_view.cls = viewset_class
+    async_view.initkwargs = view.initkwargs
+    async_view.actions = actions
+    async_view.csrf_exempt = True
+    async_view.__name__ = view.__name__
+    async_view.__doc__ = view.__doc__
+    return async_view
+
+
+def with_async_views(urlpatterns):
+    """
+    Return the URL patterns (e.g. a router's) with the viewset views replaced by their `as_async_view`.
+    """
+    return [
+        (
+            URLPattern(pattern.pattern, as_async_view(pattern.callback), pattern.default_args, pattern.name)
+            if getattr(pattern.callback, "actions", None)
+            else pattern
+        )
+        for pattern in urlpatterns
+    ]
+
+
+async def aauthenticate(request):
+    """
+    Authenticate the DRF request like `Request._authenticate`, without blocking the event loop.
+    """
+    for authenticator in request.authenticators:
+        try:
+            if hasattr(authenticator, "aauthenticate"):
+                user_auth_tuple = await authenticator.aauthenticate(request)
+            else:
+                user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+        except exceptions.APIException:
+            request._not_authenticated()
+            raise
+
+        if user_auth_tuple is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth_tuple
+            return
+    request._not_authenticated()
+
+
+async def aget_object_or_404(queryset, **filter_kwargs):
+    """
+    Async version of DRF's get_object_or_404.
+    """
+    try:
+        return await queryset.aget(**filter_kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+    except (TypeError, ValueError, ValidationError):
+        raise Http404
+
+
+def render(response):
+    """
+    Render a DRF response into a plain HttpResponse.
+
+    Django renders responses that have a `render` method in a thread when the view is async.
+    """
+    if not isinstance(response, Response):
+        return response
+    response.render()
+    rendered = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        rendered[header] = value
+    return rendered
+
+
+def cancel_event_streams_on_disconnect(application):
+    """
+    Wrap the ASGI `application` so that event streams (text/event-stream responses) stop once their
+    client disconnects.
+
+    Django 4.2 doesn't listen for the disconnect while it streams a response, and servers such as
+    uvicorn drop what is sent to a closed connection, so a stream that never ends would go on
+    forever. Once such a response has started, the wrapper waits for the disconnect and cancels
+    the request, which runs the `finally` of the view's generator.
+    """
+
+    async def wrapped_application(scope, receive, send):
+        if scope["type"] != "http":
+            return await application(scope, receive, send)
+        watcher = None
+
+        async def wait_for_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            handler.cancel()
+
+        async def watching_send(message):
+            nonlocal watcher
+            if message["type"] == "http.response.start" and is_event_stream(message):
+                watcher = asyncio.create_task(wait_for_disconnect())
+            await send(message)
+
+        handler = asyncio.ensure_future(application(scope, receive, watching_send))
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if watcher is None or not watcher.done():
+                raise  # Not cancelled by the disconnect
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    return wrapped_application
+
+
+def is_event_stream(message):
+    return any(
+        name.lower() == b"content-type" and value.startswith(b"text/event-stream") for name, value in message["headers"]
+    )
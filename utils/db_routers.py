@@ -0,0 +1,134 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.settings import api_settings
+
+from users_api.auth import StatelessJWTAuthentication
+
+# Replica the reads of the current request go to, None for the primary
+_current_replica = ContextVar("current_replica", default=None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send the reads of safe requests (GET, HEAD, OPTIONS) to a read replica, everything else to the primary.
+
+    The replica is chosen per request by ReplicaRoutingMiddleware, so all the reads of a request
+    see the same snapshot. Reads outside of requests (commands, workers) or inside a transaction
+    on the primary stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = _current_replica.get()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Route the reads of safe requests to one of settings.DATABASE_REPLICAS (see PrimaryReplicaRouter).
+
+    A user who just sent a write (any other method) is pinned to the primary for
+    settings.REPLICA_PIN_SECONDS, so they read their own writes despite the replication lag.
+    Users are told apart by the id in their access token; the pins are kept in the default
+    cache, which must be shared for pins to hold across workers.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        user_id = get_token_user_id(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if user_id is not None:
+                cache.set(get_pin_cache_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+        pinned = user_id is not None and cache.get(get_pin_cache_key(user_id)) is not None
+        token = _current_replica.set(None if pinned else random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return self.get_response(request)
+        finally:
+            _current_replica.reset(token)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        user_id = get_token_user_id(request)
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            if user_id is not None:
+                await cache.aset(get_pin_cache_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+        pinned = user_id is not None and await cache.aget(get_pin_cache_key(user_id)) is not None
+        token = _current_replica.set(None if pinned else random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_replica.reset(token)
+
+
+@contextmanager
+def using_primary():
+    """
+    Send the reads made in the block to the primary, e.g. for data cached for other users.
+    """
+    token = _current_replica.set(None)
+    try:
+        yield
+    finally:
+        _current_replica.reset(token)
+
+
+def get_pin_cache_key(user_id):
+    return f"db_routers:pinned:{user_id}"
+
+
+def get_token_user_id(request):
+    """
+    Return the user id in the request's access token, None without a valid one. Doesn't touch the database.
+    """
+    authentication = StatelessJWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    try:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = authentication.get_validated_token(raw_token)
+    except AuthenticationFailed:  # Including InvalidToken
+        return None
+    return validated_token.get(api_settings.USER_ID_CLAIM)
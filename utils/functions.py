@@ -1,13 +1,23 @@
 from django.core.exceptions import ValidationError
 
+MAX_IMAGE_FILE_SIZE = 10485760  # 10MB
+
 
 def validate_image_file(value):
     import os
 
     filesize = value.size
-    if filesize > 10485760:  # 10MB
+    if filesize > MAX_IMAGE_FILE_SIZE:
         raise ValidationError("Max file size is 10MB")
     ext = os.path.splitext(value.name)[1]
     valid_extensions = [".jpg", ".jpeg", ".png", ".gif"]
     if not ext.lower() in valid_extensions:
         raise ValidationError("Unsupported file extension. Allowed extensions are: jpg, jpeg, png, gif")
+
+
+def get_query_param_list(request, name):
+    """
+    Return the comma separated values of the query parameter `name`, e.g. ?fields=id,title
+    """
+    value = request.query_params.get(name, "") if request is not None else ""
+    return [item.strip() for item in value.split(",") if item.strip()]
@@ -18,3 +18,5 @@ PLANS = [
     ("INFO", "JOTA Info"),
     ("PRO", "JOTA PRO"),
 ]
+
+SEARCH_CONFIG = "portuguese"  # Postgres text search configuration, matches LANGUAGE_CODE
@@ -0,0 +1,125 @@
+import logging
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .processes import create_process_pool
+
+logger = logging.getLogger(__name__)
+
+# Width (in pixels) of the resized variants, the height follows the aspect ratio
+IMAGE_VARIANT_WIDTHS = {
+    "small": 320,
+    "medium": 960,
+}
+# Every variant is also available as WebP, and so is the original
+IMAGE_VARIANTS = [key for variant in IMAGE_VARIANT_WIDTHS for key in (variant, f"{variant}_webp")] + ["webp"]
+
+_executor = None
+
+
+def get_executor():
+    """
+    Return the process pool generating the image variants, started on first use.
+    """
+    global _executor
+    if _executor is None:
+        _executor = create_process_pool(settings.IMAGE_VARIANT_WORKERS)
+    return _executor
+
+
+def schedule_image_variants(instance, image_field, variants_field):
+    """
+    Generate the variants of the instance's image in the background, once the current transaction commits.
+
+    The variants are rendered by the process pool and saved by this process, whose signals (e.g. the
+    invalidation of the cached feeds) then see the change.
+    """
+    name = getattr(instance, image_field).name
+    if not name or getattr(instance, variants_field).get("source") == name:
+        return
+    label, pk = instance._meta.label, instance.pk
+
+    def save_when_done(future):
+        if future.exception() is not None:
+            logger.error("Could not generate the variants of %s", name, exc_info=future.exception())
+            return
+        try:
+            save_image_variants(label, pk, image_field, variants_field, future.result())
+        finally:
+            # Called on a thread of the pool, which keeps no connection
+            connections.close_all()
+
+    def submit():
+        get_executor().submit(generate_image_variants, name).add_done_callback(save_when_done)
+
+    transaction.on_commit(submit)
+
+
+def render_image_variants(image_file, extension):
+    """
+    Return the content of each variant of the image as {variant: (extension, bytes)}.
+    """
+    with Image.open(image_file) as image:
+        image.load()
+        image = ImageOps.exif_transpose(image)
+
+    if extension.lower() in (".jpg", ".jpeg"):
+        original_format = "JPEG"
+        image = image.convert("RGB")
+    else:
+        original_format, extension = "PNG", ".png"
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+    rendered = {"webp": (".webp", _encode(image, "WEBP"))}
+    for variant, width in IMAGE_VARIANT_WIDTHS.items():
+        resized = image.copy()
+        resized.thumbnail((width, resized.height))  # Never upscales
+        rendered[variant] = (extension, _encode(resized, original_format))
+        rendered[f"{variant}_webp"] = (".webp", _encode(resized, "WEBP"))
+    return rendered
+
+
+def generate_image_variants(name):
+    """
+    Store the variants of the image `name`, return their names as {variant: name}, plus its own as source.
+
+    Runs in a worker process, and doesn't touch the database (see save_image_variants).
+    """
+    stem, extension = os.path.splitext(name)
+    with default_storage.open(name) as image_file:
+        rendered = render_image_variants(image_file, extension)
+
+    variants = {"source": name}
+    for variant, (variant_extension, content) in rendered.items():
+        variants[variant] = default_storage.save(f"{stem}_{variant}{variant_extension}", ContentFile(content))
+    return variants
+
+
+def save_image_variants(model_label, pk, image_field, variants_field, variants):
+    """
+    Record the `variants` made by generate_image_variants in `variants_field`, return whether they were.
+
+    The variants are discarded if the image was replaced (or the instance deleted) meanwhile.
+    """
+    model = apps.get_model(model_label)
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(pk=pk).first()
+        if instance is None or getattr(instance, image_field).name != variants["source"]:
+            return False
+        setattr(instance, variants_field, variants)
+        instance.save(update_fields=[variants_field, "updated_at"])
+    return True
+
+
+def _encode(image, image_format):
+    output = BytesIO()
+    image.save(output, format=image_format, quality=85)
+    return output.getvalue()
@@ -0,0 +1,282 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Views whose requests are aggregated in the /metrics histograms, by the module of their class
+INSTRUMENTED_MODULES = ("news_api.", "users_api.")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_current_metrics = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """
+    Where the time of the current request goes: database queries, serializers and in total, plus
+    the time waited for pooled database connections (see utils/postgresql_pool).
+
+    `query_observers` are called with (sql, params, many, context, duration) after every query.
+    """
+
+    __slots__ = ("started", "db_queries", "db_time", "serializer_time", "serializing", "query_observers", "pool_wait")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.query_observers = []
+        self.pool_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.db_queries += 1
+            for observer in self.query_observers:
+                observer(sql, params, many, context, duration)
+
+    def server_timing(self, total):
+        pool = f"pool;dur={self.pool_wait * 1000:.1f}, " if self.pool_wait else ""
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries", {pool}'
+            f"serializer;dur={self.serializer_time * 1000:.1f}, total;dur={total * 1000:.1f}"
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper of every database connection, counting the query in the current request's metrics.
+
+    Connections are per thread and under ASGI the queries of a request run in other threads than
+    the middleware, so the wrapper is installed once per connection (see install_query_recorder)
+    and finds the request through the context, which sync_to_async carries to those threads.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver adding record_query to the connection (see news_api/apps.py).
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def get_request_metrics():
+    """
+    Return the RequestMetrics of the request being handled, or None outside of a request.
+    """
+    return _current_metrics.get()
+
+
+def time_serializer(to_representation, instance):
+    """
+    Call `to_representation(instance)` counting its time as serializer time, once for nested serializers.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None or metrics.serializing:
+        return to_representation(instance)
+    metrics.serializing = True
+    started = time.perf_counter()
+    try:
+        return to_representation(instance)
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics.serializing = False
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}  # labels -> [count per bucket (last one is +Inf), sum]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self.series.items()):
+            label_text = _format_labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            yield f"{self.name}_sum{{{label_text}}} {series[-1]}"
+            yield f"{self.name}_count{{{label_text}}} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.series = {}
+
+    def inc(self, labels):
+        self.series[labels] = self.series.get(labels, 0) + 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.series.items()):
+            yield f"{self.name}{{{_format_labels(labels)}}} {value}"
+
+
+class MetricsRegistry:
+    """
+    Per route aggregates of the request metrics, rendered in the Prometheus text format.
+
+    Every process keeps its own registry: with several workers, each one is scraped separately.
+    `collectors` are functions returning more lines to render, e.g. the stats of the connection pools.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter("http_requests_total", "Requests by view, method and status.")
+        self.duration = Histogram("http_request_duration_seconds", "Total request time.", DURATION_BUCKETS)
+        self.db_queries = Histogram("http_request_db_queries", "SQL queries per request.", QUERY_COUNT_BUCKETS)
+        self.db_duration = Histogram("http_request_db_duration_seconds", "SQL time per request.", DURATION_BUCKETS)
+        self.serializer_duration = Histogram(
+            "http_request_serializer_duration_seconds", "Serializer time per request.", DURATION_BUCKETS
+        )
+        self.pool_wait = Histogram(
+            "db_pool_wait_seconds", "Time waited for a pooled database connection.", POOL_WAIT_BUCKETS
+        )
+        self.collectors = []
+
+    def observe(self, view, method, status, metrics, total):
+        labels = (("view", view), ("method", method))
+        with self._lock:
+            self.requests.inc(labels + (("status", str(status)),))
+            self.duration.observe(labels, total)
+            self.db_queries.observe(labels, metrics.db_queries)
+            self.db_duration.observe(labels, metrics.db_time)
+            self.serializer_duration.observe(labels, metrics.serializer_time)
+
+    def observe_pool_wait(self, database, wait):
+        with self._lock:
+            self.pool_wait.observe((("database", database),), wait)
+
+    def render(self):
+        metrics = (self.requests, self.duration, self.db_queries, self.db_duration, self.serializer_duration)
+        with self._lock:
+            lines = []
+            for metric in metrics:
+                lines.extend(metric.render())
+            if self.pool_wait.series:
+                lines.extend(self.pool_wait.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request (SQL queries and their time, serializer time, total time).
+
+    The measures are sent back in a Server-Timing header, and the requests of the API views
+    (INSTRUMENTED_MODULES) are aggregated by view in `registry`, served by `metrics_view`.
+    Goes first in MIDDLEWARE, so the total includes the other middlewares. The content of
+    streaming responses is produced after the response is returned, so it isn't measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.process_response(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+        return self.process_response(request, response, metrics)
+
+    def process_response(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        response.headers["Server-Timing"] = metrics.server_timing(total)
+        view = self.get_view_name(request)
+        if view:
+            registry.observe(view, request.method, response.status_code, metrics, total)
+        return response
+
+    @staticmethod
+    def get_view_name(request):
+        """
+        Return the label of the request's view ("NewsArticleViewSet.list", "UserCollectionView"...), if instrumented.
+        """
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return None
+        view_class = getattr(match.func, "cls", None) or getattr(match.func, "view_class", None)
+        if view_class is None or not view_class.__module__.startswith(INSTRUMENTED_MODULES):
+            return None
+        # ViewSets serve several actions (list, retrieve...) for the same HTTP method
+        actions = getattr(match.func, "actions", None)
+        if actions:
+            return f"{view_class.__name__}.{actions.get(request.method.lower(), request.method.lower())}"
+        return view_class.__name__
+
+
+def metrics_view(request):
+    """
+    Serve the request metrics in the Prometheus text format, to holders of settings.METRICS_TOKEN (to
+    nobody when it isn't set).
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    # Compared in constant time, so the token can't be guessed from how long refusals take
+    if not token or not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _format_labels(labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,158 @@
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from utils.metrics import get_request_metrics, registry
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError as error:
+    raise ImproperlyConfigured("utils.postgresql_pool requires psycopg 3 and psycopg_pool") from error
+
+# Pools by (alias, database name, host, port): the tests and the benchmark switch to another database
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Rendered in /metrics: (metric, psycopg_pool stat, type, help, scale)
+POOL_METRICS = (
+    ("db_pool_size", "pool_size", "gauge", "Connections held by the pool, in use or not.", 1),
+    ("db_pool_available", "pool_available", "gauge", "Idle connections in the pool.", 1),
+    ("db_pool_max_size", "pool_max", "gauge", "Maximum size of the pool.", 1),
+    ("db_pool_requests_waiting", "requests_waiting", "gauge", "Requests waiting for a connection.", 1),
+    ("db_pool_requests_total", "requests_num", "counter", "Connections requested from the pool.", 1),
+    ("db_pool_requests_queued_total", "requests_queued", "counter", "Requests that had to wait.", 1),
+    ("db_pool_requests_wait_seconds_total", "requests_wait_ms", "counter", "Time spent waiting.", 0.001),
+    ("db_pool_requests_errors_total", "requests_errors", "counter", "Requests that timed out.", 1),
+    ("db_pool_connections_total", "connections_num", "counter", "Connections opened to the database.", 1),
+    ("db_pool_connections_errors_total", "connections_errors", "counter", "Failed connection attempts.", 1),
+    ("db_pool_connections_lost_total", "connections_lost", "counter", "Connections found broken.", 1),
+)
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Postgres can't drop a database others are connected to
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The PostgreSQL backend, taking its connections from a psycopg_pool.ConnectionPool shared by
+    all the threads of the process instead of connecting for every request (or thread).
+
+    Enabled with ENGINE "utils.postgresql_pool" and OPTIONS["pool"], the ConnectionPool arguments
+    (min_size, max_size, timeout, max_idle, max_lifetime...), as the pool of Django 5.1 is. Closing
+    the connection (at the end of every request, so CONN_MAX_AGE must be 0) returns it to the pool.
+    With CONN_HEALTH_CHECKS, the pool checks connections before handing them out. The time
+    spent waiting for a connection goes to the request metrics and /metrics (see utils/metrics.py).
+    """
+
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        if self.alias == NO_DB_ALIAS:
+            return None
+        key = get_pool_key(self.alias, self.settings_dict)
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        options = self.settings_dict["OPTIONS"].get("pool")
+        if not options:
+            raise ImproperlyConfigured(f"DATABASES[{self.alias!r}]['OPTIONS']['pool'] is required by the pool backend")
+        if self.settings_dict["CONN_MAX_AGE"] != 0:
+            raise ImproperlyConfigured("Pooled connections are returned at the end of requests, set CONN_MAX_AGE to 0")
+        with _pools_lock:
+            if key not in _pools:
+                connection_params = self.get_connection_params()
+                # Django sets autocommit once connected, the pool's health checks need it
+                connection_params["autocommit"] = True
+                _pools[key] = ConnectionPool(
+                    kwargs=connection_params,
+                    name=self.alias,
+                    open=False,
+                    check=ConnectionPool.check_connection if self.settings_dict["CONN_HEALTH_CHECKS"] else None,
+                    **({} if options is True else options),
+                )
+        return _pools[key]
+
+    def get_connection_params(self):
+        connection_params = super().get_connection_params()
+        connection_params.pop("pool", None)
+        return connection_params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        pool.open()
+        started = time.perf_counter()
+        connection = pool.getconn()
+        wait = time.perf_counter() - started
+        registry.observe_pool_wait(self.alias, wait)
+        metrics = get_request_metrics()
+        if metrics is not None:
+            metrics.pool_wait += wait
+
+        self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        if isolation_level is not None:
+            self.isolation_level = base.IsolationLevel(isolation_level)
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # To the pool it comes from, even if the settings changed since. The pool rolls back
+            # what the connection was in the middle of.
+            self.connection._pool.putconn(self.connection)
+        self.connection = None
+
+
+def get_pool_key(alias, settings_dict):
+    return alias, settings_dict["NAME"], settings_dict["HOST"], settings_dict["PORT"]
+
+
+def close_pools(database_name=None):
+    """
+    Close the pools (of the database `database_name`, all of them by default) and their connections.
+    """
+    with _pools_lock:
+        keys = [key for key in _pools if database_name is None or key[1] == database_name]
+        closed = [_pools.pop(key) for key in keys]
+    for pool in closed:
+        pool.close()
+
+
+def get_pool_stats():
+    """
+    Return {alias: psycopg_pool stats} of the open pools: their size, waiting clients, totals of
+    requests, wait time, errors and connections opened.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.get_stats() for (alias, *_), pool in pools if not pool.closed}
+
+
+def render_pool_stats():
+    """
+    Render the pool stats in the Prometheus text format (collected by utils.metrics.registry).
+    """
+    stats = get_pool_stats()
+    if not stats:
+        return
+    for name, stat, metric_type, documentation, scale in POOL_METRICS:
+        yield f"# HELP {name} {documentation}"
+        yield f"# TYPE {name} {metric_type}"
+        for alias, values in sorted(stats.items()):
+            yield f'{name}{{database="{alias}"}} {values.get(stat, 0) * scale}'
+
+
+registry.collectors.append(render_pool_stats)
@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+def create_process_pool(max_workers):
+    """
+    Return a process pool whose workers have Django set up with the current settings.
+    """
+    # Spawned (not forked) workers don't share the parent's database connections
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(os.environ["DJANGO_SETTINGS_MODULE"],),
+    )
@@ -0,0 +1,228 @@
+import cProfile
+import marshal
+import os
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.serializers import Serializer
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from users_api.auth import StatelessJWTAuthentication
+from utils.metrics import get_request_metrics, time_serializer
+
+PROFILE_PARAMETER = "_profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"  # X-Profile
+# ?_profile=store keeps the report for later download instead of returning it
+STORE_MODE = "store"
+PROFILE_MODES = ("1", STORE_MODE)
+TOP_FUNCTIONS = 40
+MAX_STATEMENTS = 200
+
+
+def get_profile_mode(request):
+    """
+    Return the profiling mode the request asks for, None for other values (e.g. ?_profile=0).
+    """
+    mode = request.GET.get(PROFILE_PARAMETER) or request.META.get(PROFILE_HEADER)
+    return mode if mode in PROFILE_MODES else None
+
+
+def is_admin_request(request):
+    """
+    Return whether the request carries the access token of an admin.
+
+    Tokens are only checked by the views (DRF authentication), so the middleware checks it itself.
+    """
+    try:
+        authenticated = StatelessJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    return authenticated is not None and bool(getattr(authenticated[0], "is_admin", False))
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single request on demand: admins add ?_profile=1 (or an X-Profile: 1 header).
+
+    The request runs under cProfile, and the response is replaced by a JSON report with the
+    time spent in the view, its permission classes, serializers and SQL queries, plus the most
+    expensive functions. With ?_profile=store the regular response is returned instead, with
+    an X-Profile-Id header to download the report (or the raw pstats data) from `profile_view`.
+    Stored reports are kept in the default cache, which must be shared by the workers (see the
+    README) for the download to find them whichever worker serves it.
+
+    Requests without the parameter or the header only pay for checking them, and non admins
+    can't tell the parameter apart from any other. The queries are recorded through the request
+    metrics, so this goes after utils.metrics.RequestMetricsMiddleware. Under ASGI only the event
+    loop's thread is profiled, including whatever else it runs in the meantime.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = get_profile_mode(request)
+        if not mode or not is_admin_request(request):
+            return self.get_response(request)
+
+        statements = self.record_statements()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        total = time.perf_counter() - started
+        return self.process_profile(request, response, mode, profiler, statements, total)
+
+    async def __acall__(self, request):
+        mode = get_profile_mode(request)
+        if not mode or not await sync_to_async(is_admin_request)(request):
+            return await self.get_response(request)
+
+        statements = self.record_statements()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        total = time.perf_counter() - started
+        return self.process_profile(request, response, mode, profiler, statements, total)
+
+    @staticmethod
+    def record_statements():
+        """
+        Return the list the (sql, duration) of the request's queries are appended to.
+        """
+        statements = []
+        metrics = get_request_metrics()
+        if metrics is not None:
+            metrics.query_observers.append(
+                lambda sql, params, many, context, duration: statements.append((sql, duration))
+            )
+        return statements
+
+    def process_profile(self, request, response, mode, profiler, statements, total):
+        profiler.create_stats()
+        report = build_report(request, response, profiler.stats, statements, total)
+
+        if mode != STORE_MODE:
+            return JsonResponse(report)
+        report["id"] = uuid.uuid4().hex
+        cache.set(
+            get_profile_cache_key(report["id"]),
+            {"report": report, "stats": marshal.dumps(profiler.stats)},
+            settings.PROFILE_STORE_TIMEOUT,
+        )
+        response.headers["X-Profile-Id"] = report["id"]
+        return response
+
+
+def build_report(request, response, stats, statements, total):
+    view_class = _get_view_class(request)
+
+    def measure(function):
+        code = getattr(function, "__code__", None)
+        entry = stats.get((code.co_filename, code.co_firstlineno, code.co_name)) if code else None
+        if entry is None:
+            return {"calls": 0, "ms": 0.0}
+        return {"calls": entry[1], "ms": _ms(entry[3])}
+
+    breakdown = {
+        "dispatch": measure(APIView.dispatch) if view_class and issubclass(view_class, APIView) else None,
+        "authentication": measure(StatelessJWTAuthentication.authenticate),
+        "handler": None,
+        "permissions": {},
+        "serializers": {
+            "to_representation": measure(time_serializer),
+            "validation": measure(Serializer.run_validation),
+        },
+        "sql": {"queries": len(statements), "ms": _ms(sum(duration for _, duration in statements))},
+    }
+    if view_class is not None:
+        handler_name = _get_handler_name(request)
+        breakdown["handler"] = {"name": f"{view_class.__name__}.{handler_name}"}
+        breakdown["handler"].update(measure(getattr(view_class, handler_name, None)))
+        for permission_class in getattr(view_class, "permission_classes", []):
+            for method in ("has_permission", "has_object_permission"):
+                name = getattr(permission_class, "__name__", repr(permission_class))
+                breakdown["permissions"][f"{name}.{method}"] = measure(getattr(permission_class, method))
+
+    functions = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return {
+        "method": request.method,
+        "path": request.get_full_path(),
+        "status": response.status_code,
+        "total_ms": _ms(total),
+        "breakdown": breakdown,
+        "sql": [
+            {"sql": sql, "ms": _ms(duration)}
+            for sql, duration in sorted(statements, key=lambda statement: statement[1], reverse=True)[:MAX_STATEMENTS]
+        ],
+        "functions": [
+            {
+                "function": f"{_relative_path(filename)}:{line}({name})",
+                "calls": calls,
+                "own_ms": _ms(own_time),
+                "cumulative_ms": _ms(cumulative_time),
+            }
+            for (filename, line, name), (_, calls, own_time, cumulative_time, _) in functions
+        ],
+    }
+
+
+def get_profile_cache_key(profile_id):
+    return f"profiling:{profile_id}"
+
+
+def profile_view(request, profile_id):
+    """
+    Download a report stored by ?_profile=store (admins only). ?format=pstats returns the raw
+    profile, to open with pstats or snakeviz.
+    """
+    if not is_admin_request(request):
+        return HttpResponseForbidden()
+    stored = cache.get(get_profile_cache_key(profile_id))
+    if stored is None:
+        raise Http404("Profile not found or expired")
+    if request.GET.get("format") == "pstats":
+        response = HttpResponse(stored["stats"], content_type="application/octet-stream")
+        response.headers["Content-Disposition"] = f'attachment; filename="{profile_id}.prof"'
+        return response
+    return JsonResponse(stored["report"])
+
+
+def _get_view_class(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    return getattr(match.func, "cls", None) or getattr(match.func, "view_class", None)
+
+
+def _get_handler_name(request):
+    actions = getattr(request.resolver_match.func, "actions", None)
+    method = request.method.lower()
+    return actions.get(method, method) if actions else method
+
+
+def _relative_path(filename):
+    if filename.startswith(str(settings.BASE_DIR)):
+        return os.path.relpath(filename, settings.BASE_DIR)
+    return filename
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
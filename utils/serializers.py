@@ -0,0 +1,84 @@
+from rest_framework import serializers
+
+from utils.images import IMAGE_VARIANTS
+from utils.metrics import time_serializer
+
+
+class SparseFieldsetMixin:
+    """
+    ModelSerializer mixin that supports sparse fieldsets and relation expansion.
+
+    `fields` narrows the output to the given field names (unknown names are ignored).
+    `expand` replaces the listed relations by the nested serializers declared in
+    `Meta.expandable_fields`, so the view can `select_related` them instead of the
+    client fetching each one separately.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        selected = set(fields or []) & set(self.fields)
+        if selected:
+            for name in set(self.fields) - selected:
+                self.fields.pop(name)
+
+        self.expanded_fields = []
+        expandable_fields = getattr(self.Meta, "expandable_fields", {})
+        for name in expand or []:
+            if name in expandable_fields and name in self.fields:
+                self.fields[name] = expandable_fields[name](read_only=True)
+                self.expanded_fields.append(name)
+
+    def to_representation(self, instance):
+        # Reported in the Server-Timing header and /metrics (see utils.metrics)
+        return time_serializer(super().to_representation, instance)
+
+    def get_only_fields(self):
+        """
+        Return the model field paths this serializer reads, for use with `QuerySet.only()`.
+        """
+        model_fields = {field.name for field in self.Meta.model._meta.concrete_fields}
+        only_fields = []
+        for name, field in self.fields.items():
+            if field.source not in model_fields:
+                # Fields computed from the whole instance declare what they read
+                only_fields += getattr(field, "model_fields", [])
+                continue
+            only_fields.append(field.source)
+            if name in self.expanded_fields:
+                only_fields += [f"{field.source}__{nested}" for nested in field.get_only_fields()]
+        return only_fields
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read only field with the URL of each variant of an image (see utils.images).
+
+    Until the variants are generated, every variant falls back to the original image.
+    """
+
+    def __init__(self, image_field, variants_field, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+        self.image_field = image_field
+        self.variants_field = variants_field
+        self.model_fields = [image_field, variants_field]
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image:
+            return None
+        variants = getattr(instance, self.variants_field) or {}
+        if variants.get("source") != image.name:
+            variants = {}
+        return {
+            variant: self._build_url(image.storage, variants.get(variant, image.name)) for variant in IMAGE_VARIANTS
+        }
+
+    def _build_url(self, storage, name):
+        url = storage.url(name)
+        request = self.context.get("request", None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
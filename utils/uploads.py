@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import ImageFile
+
+from utils.functions import MAX_IMAGE_FILE_SIZE
+
+# Form fields holding images (NewsArticle.image and User.profile_picture)
+IMAGE_UPLOAD_FIELDS = ("image", "profile_picture")
+
+# Leading bytes of the formats accepted by validate_image_file
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "JPEG",
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"GIF87a": "GIF",
+    b"GIF89a": "GIF",
+}
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Upload handler that checks image uploads while they are streamed in.
+
+    It must come first in settings.FILE_UPLOAD_HANDLERS: it passes the chunks on to the next
+    handlers, but aborts the request (400) as soon as an image field turns out not to be a
+    JPEG/PNG/GIF, declares too many pixels or goes over the 10MB limit, before the rest of
+    the body is received and buffered. Other files are not checked.
+    """
+
+    # Give up if the image header hasn't been parsed after this many bytes
+    header_size_limit = 512 * 1024
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.checking = field_name in IMAGE_UPLOAD_FIELDS
+        self.received = 0
+        self.parser = ImageFile.Parser() if self.checking else None
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.checking:
+            return raw_data
+
+        self.received += len(raw_data)
+        if self.received > MAX_IMAGE_FILE_SIZE:
+            raise MultiPartParserError("Max file size is 10MB")
+
+        if self.parser is not None:
+            if start == 0 and not any(raw_data.startswith(signature) for signature in IMAGE_SIGNATURES):
+                raise MultiPartParserError("Unsupported image format. Allowed formats are: jpg, jpeg, png, gif")
+            self._parse_header(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.checking and self.parser is not None:
+            raise MultiPartParserError("Invalid image file")
+        # Let the next handler build the uploaded file
+        return None
+
+    def _parse_header(self, raw_data):
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            raise MultiPartParserError("Invalid image file")
+
+        image = self.parser.image
+        if image is None:
+            if self.received > self.header_size_limit:
+                raise MultiPartParserError("Invalid image file")
+            return
+
+        width, height = image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise MultiPartParserError(f"Image is too large ({width}x{height} pixels)")
+        # Only the header was needed, the rest of the image is not decoded
+        self.parser = None